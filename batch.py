@@ -0,0 +1,175 @@
+"""
+Bulk maze generation across a pool of worker processes.
+
+Every job carries its own seed and builds its maze with a private
+random.Random (or NumPy generator), so a batch gives the same mazes
+whatever the number of processes or the order the workers finish in.
+Workers send back the maze in the two-bits-per-cell format of mazefile
+rather than pickled Cell graphs.
+
+    python batch.py growing_tree 30 40 --count 1000 --seed 7 -o mazes.bin
+"""
+import argparse
+import functools
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import time
+import binary_tree
+import compact_grid
+import ellers
+import growing_tree
+import maze
+import mazefile
+
+ALGORITHMS = ['binary_tree', 'growing_tree', 'sidewinder', 'ellers']
+# algorithms that can run on a MaskedGrid
+MASKABLE = ['binary_tree', 'growing_tree']
+
+# seed and size of the mazefile data that follows
+RECORD_HEADER = struct.Struct('<QI')
+
+
+class Job:
+
+    def __init__(self, algorithm, rows, columns, seed, mask=None, choose=None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError("unknown algorithm %r" % algorithm)
+        if mask and algorithm not in MASKABLE:
+            raise ValueError("%s does not support masks" % algorithm)
+        self.algorithm = algorithm
+        self.rows = rows
+        self.columns = columns
+        self.seed = seed
+        # mask is an image file name, loaded once per worker process
+        self.mask = mask
+        self.choose = choose
+
+    def __repr__(self):
+        return "Job(%r, %r, %r, seed=%r)" % (self.algorithm, self.rows, self.columns, self.seed)
+
+
+class Result:
+
+    def __init__(self, job, data):
+        self.job = job
+        # mazefile.dumps() output
+        self.data = data
+
+    def to_grid(self, cls=compact_grid.CompactGrid):
+        """ Rebuild the maze, as a CompactGrid by default """
+        return mazefile.loads(self.data, cls)
+
+
+def cached_by_file(maxsize):
+    """
+    Decorator caching a function of a file name like functools.lru_cache,
+    keyed on the file's modification time and size too so that an edited
+    file is read again
+    """
+    def decorate(function):
+        cached = functools.lru_cache(maxsize)(lambda filename, mtime_ns, size: function(filename))
+
+        @functools.wraps(function)
+        def wrapper(filename):
+            stat = os.stat(filename)
+            return cached(filename, stat.st_mtime_ns, stat.st_size)
+        return wrapper
+    return decorate
+
+
+@cached_by_file(maxsize=8)
+def load_mask(filename):
+    return maze.Mask.from_image(filename)
+
+
+def generate(job):
+    """ Build the maze of one job, returning its Result """
+    rng = random.Random(job.seed)
+    if job.mask:
+        grid = maze.MaskedGrid(load_mask(job.mask))
+    else:
+        grid = compact_grid.CompactGrid(job.rows, job.columns)
+
+    if job.algorithm == 'binary_tree':
+        binary_tree.BinaryTree(grid, rng).build_maze(grid)
+    elif job.algorithm == 'growing_tree':
+        growing_tree.GrowingTree(grid, rng, job.choose).build_maze(grid)
+    elif job.algorithm == 'ellers':
+        ellers.Ellers(grid.rows, grid.columns, rng).build_maze(grid)
+    else:
+        import vectorized
+        vectorized.VectorizedSidewinder(grid, job.seed).build_maze(grid)
+
+    return Result(job, mazefile.dumps(grid))
+
+
+def make_jobs(algorithm, rows, columns, count, seed=0, mask=None, choose=None):
+    """ count jobs with the consecutive seeds seed, seed + 1, ... """
+    return [Job(algorithm, rows, columns, seed + i, mask, choose) for i in range(count)]
+
+
+def run(jobs, processes=None, chunksize=None):
+    """
+    Yield the Result of every job, in job order, from a process pool
+    """
+    if chunksize is None:
+        workers = processes or multiprocessing.cpu_count()
+        chunksize = max(1, len(jobs) // (workers * 4))
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap(generate, jobs, chunksize):
+            yield result
+
+
+def write_results(results, out):
+    for result in results:
+        out.write(RECORD_HEADER.pack(result.job.seed, len(result.data)))
+        out.write(result.data)
+
+
+def read_results(data):
+    """ Yield (seed, mazefile data) from the output of write_results """
+    pos = 0
+    while pos < len(data):
+        seed, size = RECORD_HEADER.unpack_from(data, pos)
+        pos += RECORD_HEADER.size
+        yield seed, data[pos:pos + size]
+        pos += size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate mazes in bulk")
+    parser.add_argument('algorithm', choices=ALGORITHMS)
+    parser.add_argument('rows', type=int)
+    parser.add_argument('columns', type=int)
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first maze")
+    parser.add_argument('--mask', help="mask image, overrides rows and columns")
+    parser.add_argument('--choose', help="GrowingTree strategy, e.g. newest/random")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('-o', '--output', help="file for the generated mazes")
+    args = parser.parse_args(argv)
+
+    rows, columns = args.rows, args.columns
+    if args.mask:
+        mask = load_mask(args.mask)
+        rows, columns = mask.n_rows, mask.n_columns
+    jobs = make_jobs(args.algorithm, rows, columns, args.count, args.seed,
+                     args.mask, args.choose)
+
+    start = time.perf_counter()
+    results = run(jobs, args.processes)
+    if args.output:
+        with open(args.output, 'wb') as out:
+            write_results(results, out)
+    else:
+        for _ in results:
+            pass
+    seconds = time.perf_counter() - start
+    print("%d mazes in %.2f s (%.0f mazes/s)" % (len(jobs), seconds, len(jobs) / seconds),
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
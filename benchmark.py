@@ -0,0 +1,251 @@
+"""
+Benchmarks of grid construction, generators and renderers.
+
+Every case is timed on square grids of several sizes and reported in
+cells per second, with the peak memory allocated while it runs (measured
+with tracemalloc in a separate run, since tracing slows Python down).
+Results can be saved as JSON and compared with an earlier run:
+
+    python benchmark.py --sizes 100 500 -o before.json
+    python benchmark.py --sizes 100 500 --compare before.json
+"""
+import argparse
+import gc
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import binary_tree
+import compact_grid
+import growing_tree
+import maze
+
+SIZES = [100, 250, 500, 1000]
+# GrowingTree is also run at 2000 to show that its time per cell stays flat
+SCALING_SIZES = SIZES + [2000]
+STRATEGIES = ['newest', 'oldest', 'random', 'newest/random']
+
+# a case slower than this fraction is reported as a regression
+THRESHOLD = 0.10
+
+
+def synthetic_mask(size, kind):
+    """
+    A size x size Mask: 'disc' keeps a centred disc, 'noise' turns off
+    about 30% of the positions at random (always the same ones)
+    """
+    import numpy as np
+    if kind == 'disc':
+        y, x = np.ogrid[:size, :size]
+        centre = (size - 1) / 2
+        on = (y - centre) ** 2 + (x - centre) ** 2 <= (size / 2) ** 2
+    elif kind == 'noise':
+        on = np.random.default_rng(size).random((size, size)) >= 0.3
+    else:
+        raise ValueError("unknown mask kind %r" % kind)
+    return maze.Mask.from_bools(on)
+
+
+def built_grid(size):
+    grid = maze.Grid(size, size)
+    growing_tree.GrowingTree(grid).build_maze(grid)
+    return grid
+
+# Each case takes a size, does any setup that should not be timed, and
+# returns the function to time.
+
+def grid_case(size):
+    return lambda: maze.Grid(size, size)
+
+
+def compact_grid_case(size):
+    return lambda: compact_grid.CompactGrid(size, size)
+
+
+def binary_tree_case(size):
+    grid = maze.Grid(size, size)
+    return lambda: binary_tree.BinaryTree(grid).build_maze(grid)
+
+
+def vectorized_case(name):
+    def case(size):
+        import vectorized
+        grid = compact_grid.CompactGrid(size, size)
+        return lambda: getattr(vectorized, name)(grid).build_maze(grid)
+    return case
+
+
+def growing_tree_case(strategy):
+    def case(size):
+        grid = compact_grid.CompactGrid(size, size)
+        return lambda: growing_tree.GrowingTree(grid, choose=strategy).build_maze(grid)
+    return case
+
+
+def masked_grid_case(kind):
+    def case(size):
+        mask = synthetic_mask(size, kind)
+        def run():
+            grid = maze.MaskedGrid(mask)
+            growing_tree.GrowingTree(grid).build_maze(grid)
+        return run
+    return case
+
+
+def str_case(size):
+    grid = built_grid(size)
+    return lambda: str(grid)
+
+
+def to_svg_case(size):
+    grid = built_grid(size)
+    return lambda: grid.to_svg(filename=io.StringIO())
+
+
+def write_svg_case(size):
+    grid = built_grid(size)
+    return lambda: grid.write_svg(io.StringIO())
+
+
+# name -> (case, largest size it is run at or None for no limit, sizes
+# it is run at unless --sizes is given)
+CASES = {
+    'grid': (grid_case, None, SIZES),
+    'compact_grid': (compact_grid_case, None, SIZES),
+    'binary_tree': (binary_tree_case, None, SIZES),
+    'vectorized:binary_tree': (vectorized_case('VectorizedBinaryTree'), None, SIZES),
+    'vectorized:sidewinder': (vectorized_case('VectorizedSidewinder'), None, SIZES),
+    'masked_grid:disc': (masked_grid_case('disc'), None, SIZES),
+    'masked_grid:noise': (masked_grid_case('noise'), None, SIZES),
+    'str': (str_case, None, SIZES),
+    # the svgwrite renderer is quadratic in practice
+    'to_svg': (to_svg_case, 100, SIZES),
+    'write_svg': (write_svg_case, None, SIZES),
+}
+for strategy in STRATEGIES:
+    CASES['growing_tree:' + strategy] = (growing_tree_case(strategy), None, SCALING_SIZES)
+
+
+def measure(case, size, repeat=1, memory=True):
+    """ Best time in seconds of repeat runs and peak traced bytes """
+    best = None
+    for _ in range(repeat):
+        run = case(size)
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    peak = None
+    if memory:
+        run = case(size)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+
+def select_cases(names):
+    """ Case names matching names, a name selecting all its variants """
+    if not names:
+        return list(CASES)
+    selected = [case for case in CASES
+                if case in names or case.split(':')[0] in names]
+    unknown = [name for name in names
+               if name not in CASES and not any(case.split(':')[0] == name for case in CASES)]
+    if unknown:
+        raise ValueError("unknown benchmark %s" % ", ".join(unknown))
+    return selected
+
+
+def run_benchmarks(names, sizes=None, repeat=1, memory=True, out=sys.stdout):
+    """ Run the cases names at sizes, or at their own default sizes """
+    results = []
+    print("%-26s %6s %10s %10s %12s %10s" % ('case', 'size', 'cells', 'seconds',
+                                             'cells/s', 'peak MB'), file=out)
+    for name in names:
+        case, largest, default_sizes = CASES[name]
+        for size in sizes or default_sizes:
+            if largest is not None and size > largest:
+                continue
+            seconds, peak = measure(case, size, repeat, memory)
+            cells = size * size
+            result = {'case': name, 'size': size, 'cells': cells, 'seconds': seconds,
+                      'cells_per_s': cells / seconds if seconds else None,
+                      'peak_bytes': peak}
+            results.append(result)
+            print("%-26s %6d %10d %10.3f %12.0f %10s" % (
+                name, size, cells, seconds, result['cells_per_s'] or 0,
+                '-' if peak is None else '%.1f' % (peak / 1e6)), file=out)
+            out.flush()
+    return results
+
+
+def report(results):
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold=THRESHOLD, out=sys.stdout):
+    """
+    Print the change of every case also in the baseline report and
+    return the (case, size) pairs that got slower by more than threshold
+    """
+    before = {(r['case'], r['size']): r for r in baseline['results']}
+    regressions = []
+    print("%-26s %6s %10s %10s %8s" % ('case', 'size', 'before', 'after', 'change'), file=out)
+    for result in results:
+        key = (result['case'], result['size'])
+        if key not in before:
+            continue
+        old, new = before[key]['seconds'], result['seconds']
+        change = (new - old) / old if old else 0.0
+        flag = ''
+        if change > threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print("%-26s %6d %10.3f %10.3f %+7.1f%%%s" % (key[0], key[1], old, new,
+                                                       100 * change, flag), file=out)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark maze generation and rendering")
+    parser.add_argument('cases', nargs='*',
+                        help="cases to run (default all): %s" % ", ".join(CASES))
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help="grid sizes (default %s, up to %d for growing_tree)" % (
+                            " ".join(map(str, SIZES)), SCALING_SIZES[-1]))
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case, best kept")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="skip the tracemalloc run")
+    parser.add_argument('-o', '--output', help="save the results as JSON")
+    parser.add_argument('--compare', help="JSON results of an earlier run")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+
+    names = select_cases(args.cases)
+    results = run_benchmarks(names, args.sizes, args.repeat, args.memory)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report(results), f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,21 @@
 import random
 import maze
+import profiling
 
 class BinaryTree:
 
+    @profiling.timed('binary_tree.build_maze')
     def build_maze(self, grid):
         for cell in grid.each_cell():
-            neighbors = []
-            n = cell.get_neighbors()
-            if n['north']:
-                neighbors.append(n['north'])
-            if n['east']:
-                neighbors.append(n['east'])
+            # only two of the four neighbors are needed, so skip the dict
+            # that get_neighbors() builds
+            neighbors = [n for n in (cell.north(), cell.east()) if n]
             if neighbors:
-                cell.link(random.choice(neighbors))
+                cell.link(self.rng.choice(neighbors))
 
-    def __init__(self, grid):
+    def __init__(self, grid, rng=random):
+        # rng is the random module or a seeded random.Random
+        self.rng = rng
         grid.reload_cells()
         
 
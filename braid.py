@@ -0,0 +1,131 @@
+"""
+Dead-end removal for finished mazes.
+
+braid() links dead ends to a neighbor, adding loops; sparsify() cuts
+dead-end corridors back, removing cells from the maze.  Both work on the
+flat link bits of compact_grid.link_array(): degrees and the initial dead
+ends come from one vectorized sweep, and only the dead ends themselves
+are then visited.  A CompactGrid is changed in place through its links
+array; other grids get the same changes through Cell.link/unlink.
+"""
+import random
+from collections import deque
+import numpy as np
+import compact_grid
+import graph
+from compact_grid import N, S, E, W, MASKED
+
+DEGREE = graph.DEGREE.tolist()
+OPPOSITE = {N: S, S: N, E: W, W: E}
+
+
+def dead_ends(grid):
+    """ Flat indices of the cells with exactly one passage, a NumPy array """
+    return np.flatnonzero(graph.DEGREE[compact_grid.link_array(grid).reshape(-1)] == 1)
+
+
+def working_links(grid):
+    """ A mutable flat array of link bits: grid.links itself when possible """
+    if isinstance(grid, compact_grid.CompactGrid):
+        return grid.links
+    return bytearray(compact_grid.link_array(grid).tobytes())
+
+
+def steps(columns, size, cell):
+    """ (bit, neighbor) of the positions next to cell inside the grid """
+    column = cell % columns
+    result = []
+    if cell >= columns:
+        result.append((N, cell - columns))
+    if cell + columns < size:
+        result.append((S, cell + columns))
+    if column + 1 < columns:
+        result.append((E, cell + 1))
+    if column > 0:
+        result.append((W, cell - 1))
+    return result
+
+
+def braid(grid, p=1.0, rng=random):
+    """
+    Remove about a fraction p of the dead ends by linking each to a
+    neighbor it is not linked to yet, preferring neighbors that are dead
+    ends too, so that one new passage removes two of them.  Returns the
+    new passages as (a, b) flat indices.
+    """
+    links = working_links(grid)
+    columns, size = grid.columns, len(links)
+    candidates = dead_ends(grid).tolist()
+    rng.shuffle(candidates)
+    added = []
+    for cell in candidates:
+        # an earlier passage may already have reached this one
+        if DEGREE[links[cell]] != 1 or rng.random() > p:
+            continue
+        bits = links[cell]
+        options = [(bit, neighbor) for bit, neighbor in steps(columns, size, cell)
+                   if not bits & bit and not links[neighbor] & MASKED]
+        if not options:
+            continue
+        best = [option for option in options if DEGREE[links[option[1]]] == 1]
+        bit, neighbor = rng.choice(best or options)
+        links[cell] |= bit
+        links[neighbor] |= OPPOSITE[bit]
+        added.append((cell, neighbor))
+
+    if links is not getattr(grid, 'links', None):
+        for cell, neighbor in added:
+            compact_grid.link_indices(grid, cell, neighbor)
+    return added
+
+
+def sparsify(grid, fraction=0.5, rng=random):
+    """
+    Prune dead-end corridors: repeatedly unlink a dead end from its only
+    neighbor, until fraction of the cells have been cut off or no dead end
+    is left.  Cells that become dead ends are put on a work queue, so the
+    grid is scanned only once.  Returns the flat indices of the removed
+    cells, which are left without any passage.
+    """
+    links = working_links(grid)
+    columns = grid.columns
+    offset = {N: -columns, S: columns, E: 1, W: -1}
+    present = int(np.count_nonzero(compact_grid.presence(grid)))
+    budget = int(fraction * present)
+    initial = dead_ends(grid).tolist()
+    rng.shuffle(initial)
+    queue = deque(initial)
+    removed = []
+    unlinked = []
+    while queue and len(removed) < budget:
+        cell = queue.popleft()
+        if DEGREE[links[cell]] != 1:
+            continue
+        # a dead end's link bits are exactly its one direction
+        bit = links[cell]
+        neighbor = cell + offset[bit]
+        links[cell] = 0
+        links[neighbor] &= ~OPPOSITE[bit]
+        removed.append(cell)
+        unlinked.append((cell, neighbor))
+        if DEGREE[links[neighbor]] == 1:
+            queue.append(neighbor)
+
+    if links is not getattr(grid, 'links', None):
+        for cell, neighbor in unlinked:
+            compact_grid.unlink_indices(grid, cell, neighbor)
+    return removed
+
+
+def main():
+    import growing_tree
+    import maze
+    grid = maze.Grid(10, 15)
+    growing_tree.GrowingTree(grid).build_maze(grid)
+    print("%d dead ends" % len(dead_ends(grid)))
+    braid(grid, 0.5)
+    print(grid)
+    print("%d dead ends after braiding half of them" % len(dead_ends(grid)))
+
+if __name__ == "__main__":
+    main()
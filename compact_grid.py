@@ -0,0 +1,340 @@
+import random
+from array import array
+import maze
+import profiling
+
+# Link bits stored for every cell in CompactGrid.links
+N, S, E, W = 1, 2, 4, 8
+# Set instead of link bits for positions that are not part of the maze
+MASKED = 0x80
+
+# direction name -> (bit, opposite bit, row offset, column offset)
+DIRECTIONS = {'north': (N, S, -1, 0),
+              'south': (S, N, 1, 0),
+              'east': (E, W, 0, 1),
+              'west': (W, E, 0, -1)}
+
+
+class CompactCell:
+    """
+    Lightweight view of one cell of a CompactGrid.
+
+    Instances are created on demand and hold no state of their own: links
+    and the visited flag live in the grid's flat arrays, so two views of the
+    same position compare (and hash) equal.
+    """
+    __slots__ = ('grid', 'row', 'column', 'index')
+
+    def __init__(self, grid, row, column):
+        self.grid = grid
+        self.row = row
+        self.column = column
+        self.index = row * grid.columns + column
+
+    def _neighbor(self, direction):
+        _, _, drow, dcol = DIRECTIONS[direction]
+        return self.grid[self.row + drow, self.column + dcol]
+
+    def north(self):
+        return self._neighbor('north')
+
+    def south(self):
+        return self._neighbor('south')
+
+    def east(self):
+        return self._neighbor('east')
+
+    def west(self):
+        return self._neighbor('west')
+
+    @property
+    def neighbors(self):
+        return {direction: self._neighbor(direction) for direction in DIRECTIONS}
+
+    def get_neighbors(self):
+        return self.neighbors
+
+    def get_available_neighbors(self):
+        grid, row, column = self.grid, self.row, self.column
+        return [n for n in (grid[row - 1, column], grid[row + 1, column],
+                            grid[row, column + 1], grid[row, column - 1]) if n]
+
+    def get_visited(self):
+        return self.grid.is_visited(self.index)
+
+    def set_visited(self):
+        self.grid.set_visited(self.index)
+
+    def clear_visited(self):
+        self.grid.clear_visited(self.index)
+
+    def _direction_to(self, cell):
+        drow = cell.row - self.row
+        dcol = cell.column - self.column
+        for direction, (_, _, r, c) in DIRECTIONS.items():
+            if (r, c) == (drow, dcol):
+                return direction
+        raise ValueError("%r is not adjacent to %r" % (cell, self))
+
+    def link(self, cell, bidi=True):
+        # links are always stored on both sides, bidi is kept for
+        # compatibility with Cell.link
+        bit, opposite, _, _ = DIRECTIONS[self._direction_to(cell)]
+        links = self.grid.links
+        links[self.index] |= bit
+        links[cell.index] |= opposite
+
+    def unlink(self, cell, bidi=True):
+        bit, opposite, _, _ = DIRECTIONS[self._direction_to(cell)]
+        links = self.grid.links
+        links[self.index] &= ~bit
+        links[cell.index] &= ~opposite
+
+    def get_links(self):
+        bits = self.grid.links[self.index]
+        return tuple(self._neighbor(direction)
+                     for direction, (bit, _, _, _) in DIRECTIONS.items()
+                     if bits & bit)
+
+    def is_linked(self, cell):
+        if not cell:
+            return False
+        drow = cell.row - self.row
+        dcol = cell.column - self.column
+        for bit, _, r, c in DIRECTIONS.values():
+            if (r, c) == (drow, dcol):
+                return bool(self.grid.links[self.index] & bit)
+        return False
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactCell) and other.grid is self.grid and
+                other.index == self.index)
+
+    def __hash__(self):
+        return hash((id(self.grid), self.index))
+
+    def __repr__(self):
+        return "Cell(%r,%r)" % (self.row, self.column)
+
+    def __str__(self):
+        return "Cell row %s column %s" % (self.row, self.column)
+
+
+class CompactGrid(maze.Grid):
+    """
+    Grid backed by flat arrays instead of one Cell object per position.
+
+    links holds one byte per cell with the N/S/E/W bits of the passages
+    leaving it, visited is a bitmap with one bit per cell.  Cells handed
+    out by __getitem__, each_cell and random_cell are CompactCell views, so
+    generators and renderers written against Grid work unchanged.
+
+    With a Mask, positions that are off hold the MASKED bit and behave like
+    the missing cells of a MaskedGrid.
+    """
+
+    def __init__(self, rows, columns, mask=None):
+        self.mask = mask
+        super(CompactGrid, self).__init__(rows, columns)
+
+    @profiling.timed('grid.prepare_grid')
+    def prepare_grid(self):
+        size = self.rows * self.columns
+        if self.mask is None:
+            self.links = bytearray(size)
+        else:
+            self.links = self.mask.bits.translate(bytes([MASKED]) + bytes(255))
+        self.visited = bytearray((size + 7) // 8)
+
+    def configure_cells(self):
+        # neighbors are computed from the cell index, nothing to configure
+        pass
+
+    def __getitem__(self, key):
+        if type(key) == int:
+            if 0 <= key < self.rows:
+                return [self[key, j] for j in range(self.columns)]
+        else:
+            row, column = key
+            if (0 <= row < self.rows and 0 <= column < self.columns and
+                not self.links[row * self.columns + column] & MASKED):
+                return CompactCell(self, row, column)
+
+    def random_cell(self, rng=random):
+        if self.mask is not None:
+            return CompactCell(self, *self.mask.random_location(rng))
+        return CompactCell(self, rng.randrange(0, self.rows),
+                           rng.randrange(0, self.columns))
+
+    def each_row(self):
+        """
+        Iterate over each row in the grid
+        """
+        for i in range(self.rows):
+            yield [self[i, j] for j in range(self.columns)]
+
+    def each_cell(self):
+        """
+        Iterator over all cells in the grid
+        """
+        links = self.links
+        for i in range(self.rows):
+            for j in range(self.columns):
+                if not links[i * self.columns + j] & MASKED:
+                    yield CompactCell(self, i, j)
+
+    def reset(self):
+        """
+        Clear every link and visited bit in place, keeping MASKED positions
+        """
+        link_array(self)[...] &= MASKED
+        self.visited[:] = bytes(len(self.visited))
+        self.distances = None
+
+    def is_visited(self, index):
+        return bool(self.visited[index >> 3] & (1 << (index & 7)))
+
+    def set_visited(self, index):
+        self.visited[index >> 3] |= 1 << (index & 7)
+
+    def clear_visited(self, index):
+        self.visited[index >> 3] &= ~(1 << (index & 7))
+
+    def link_rows(self):
+        """
+        Iterate over the link bits of each row, without copying them
+        """
+        view = memoryview(self.links)
+        for i in range(self.rows):
+            yield view[i * self.columns:(i + 1) * self.columns]
+
+    def to_grid(self):
+        """
+        Copy this maze into a regular maze.Grid (or maze.MaskedGrid) of
+        Cell objects
+        """
+        if self.mask is not None:
+            grid = maze.MaskedGrid(self.mask)
+        else:
+            grid = maze.Grid(self.rows, self.columns)
+        links = self.links
+        for cell in grid.each_cell():
+            bits = links[cell.row * self.columns + cell.column]
+            if bits & E:
+                cell.link(cell.east())
+            if bits & S:
+                cell.link(cell.south())
+        return grid
+
+    def __repr__(self):
+        return "CompactGrid (%r,%r)" % (self.rows, self.columns)
+
+
+def link_array(grid):
+    """
+    The link bits of any grid as a (rows, columns) NumPy uint8 array.
+
+    For a CompactGrid this is a writable view of grid.links, other grids
+    are converted row by row with Grid.link_rows().
+    """
+    import numpy as np
+    if isinstance(grid, CompactGrid):
+        links = np.frombuffer(grid.links, dtype=np.uint8)
+    else:
+        links = np.frombuffer(b"".join(grid.link_rows()), dtype=np.uint8)
+    return links.reshape(grid.rows, grid.columns)
+
+
+def presence(grid):
+    """ (rows, columns) NumPy bool array, True where the grid has a cell """
+    import numpy as np
+    if isinstance(grid, CompactGrid):
+        return (link_array(grid) & MASKED) == 0
+    if isinstance(grid, maze.MaskedGrid):
+        bits = np.frombuffer(grid.mask.bits, dtype=np.uint8)
+        return bits.reshape(grid.rows, grid.columns).astype(bool)
+    return np.ones((grid.rows, grid.columns), dtype=bool)
+
+
+def neighbor_table(grid):
+    """
+    Neighbors of every cell by flat index (row * columns + column).
+
+    Returns (table, degree): table is an array('i') with four slots per
+    cell, the first degree[i] of which hold the indices of cell i's
+    neighbors and the rest -1; degree is a bytearray.  Both are plain
+    arrays so that generators can index them quickly from Python.
+    """
+    import numpy as np
+    present = presence(grid)
+    rows, columns = present.shape
+    index = np.arange(rows * columns, dtype=np.int32).reshape(rows, columns)
+    table = np.full((rows, columns, 4), -1, dtype=np.int32)
+    table[1:, :, 0] = np.where(present[:-1, :], index[:-1, :], -1)
+    table[:-1, :, 1] = np.where(present[1:, :], index[1:, :], -1)
+    table[:, :-1, 2] = np.where(present[:, 1:], index[:, 1:], -1)
+    table[:, 1:, 3] = np.where(present[:, :-1], index[:, :-1], -1)
+    table[~present] = -1
+    # move the neighbors to the front of each row of four slots
+    table = -np.sort(-table.reshape(-1, 4), axis=1)
+    degree = np.count_nonzero(table >= 0, axis=1).astype(np.uint8)
+    return array('i', table.tobytes()), bytearray(degree.tobytes())
+
+
+def direction_bits(columns, a, b):
+    """ (bit of a towards b, bit of b towards a) for adjacent flat indices """
+    if b - a == columns:
+        return S, N
+    if a - b == columns:
+        return N, S
+    if b - a == 1:
+        return E, W
+    return W, E
+
+
+def link_indices(grid, a, b):
+    """ Link the adjacent cells at flat indices a and b of any grid """
+    columns = grid.columns
+    if not isinstance(grid, CompactGrid):
+        grid[divmod(a, columns)].link(grid[divmod(b, columns)])
+        return
+    bit, opposite = direction_bits(columns, a, b)
+    grid.links[a] |= bit
+    grid.links[b] |= opposite
+
+
+def unlink_indices(grid, a, b):
+    """ Unlink the adjacent cells at flat indices a and b of any grid """
+    columns = grid.columns
+    if not isinstance(grid, CompactGrid):
+        grid[divmod(a, columns)].unlink(grid[divmod(b, columns)])
+        return
+    bit, opposite = direction_bits(columns, a, b)
+    grid.links[a] &= ~bit
+    grid.links[b] &= ~opposite
+
+
+def link_all(grid, links):
+    """
+    Link the cells of any grid as given by a (rows, columns) NumPy array of
+    N/S/E/W bits, on top of the links the grid already has
+    """
+    import numpy as np
+    if isinstance(grid, CompactGrid):
+        link_array(grid)[...] |= links & (N | S | E | W)
+        return
+    for row, col in zip(*np.nonzero(links & E)):
+        grid[row, col].link(grid[row, col + 1])
+    for row, col in zip(*np.nonzero(links & S)):
+        grid[row, col].link(grid[row + 1, col])
+
+
+def main():
+    import binary_tree
+    grid = CompactGrid(10, 10)
+    bt = binary_tree.BinaryTree(grid)
+    bt.build_maze(grid)
+    print(grid)
+
+if __name__ == "__main__":
+    main()
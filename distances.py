@@ -0,0 +1,140 @@
+from array import array
+import compact_grid
+from compact_grid import N, S, E, W
+
+class Distances:
+    """
+    Number of steps from a root cell to every cell of a grid.
+
+    Distances are kept in a flat array indexed by row * columns + column,
+    with -1 for cells that cannot be reached, and are computed by an
+    iterative breadth-first flood fill over the links.  Indexing with a
+    cell gives its distance or None.
+    """
+
+    def __init__(self, grid, root, cells=None):
+        self.grid = grid
+        self.root = root
+        self.columns = grid.columns
+        self.cells = flood(grid, root) if cells is None else cells
+        self.farthest = None
+
+    def index(self, cell):
+        return cell.row * self.columns + cell.column
+
+    def cell_at(self, index):
+        return self.grid[divmod(index, self.columns)]
+
+    def __getitem__(self, cell):
+        distance = self.cells[self.index(cell)]
+        return distance if distance >= 0 else None
+
+    def __contains__(self, cell):
+        return self.cells[self.index(cell)] >= 0
+
+    def max(self):
+        """ (cell, distance) of a cell farthest from the root """
+        if self.farthest is None:
+            distance = max(self.cells)
+            self.farthest = (self.cell_at(self.cells.index(distance)), distance)
+        return self.farthest
+
+    def path_cells(self, goal):
+        """ Cells of a shortest path from the root to goal, root first """
+        if goal not in self:
+            raise ValueError("%r cannot be reached from %r" % (goal, self.root))
+        path = [goal]
+        current = goal
+        while current != self.root:
+            for neighbor in current.get_links():
+                if self.cells[self.index(neighbor)] == self.cells[self.index(current)] - 1:
+                    current = neighbor
+                    break
+            path.append(current)
+        path.reverse()
+        return path
+
+    def path_to(self, goal):
+        """ Distances restricted to a shortest path from the root to goal """
+        breadcrumbs = array('i', [-1]) * len(self.cells)
+        for cell in self.path_cells(goal):
+            index = self.index(cell)
+            breadcrumbs[index] = self.cells[index]
+        return Distances(self.grid, self.root, breadcrumbs)
+
+
+def flood(grid, root):
+    """
+    Breadth-first distances from root, one frontier list per level
+    """
+    size = grid.rows * grid.columns
+    if isinstance(grid, compact_grid.CompactGrid):
+        return flood_links(grid.links, grid.columns, root.row * grid.columns + root.column)
+
+    columns = grid.columns
+    cells = array('i', [-1]) * size
+    cells[root.row * columns + root.column] = 0
+    frontier = [root]
+    distance = 0
+    while frontier:
+        distance += 1
+        reached = []
+        for cell in frontier:
+            for neighbor in cell.get_links():
+                index = neighbor.row * columns + neighbor.column
+                if cells[index] < 0:
+                    cells[index] = distance
+                    reached.append(neighbor)
+        frontier = reached
+    return cells
+
+
+def flood_links(links, columns, start):
+    """ Breadth-first distances over a flat array of N/S/E/W link bits """
+    cells = array('i', [-1]) * len(links)
+    cells[start] = 0
+    frontier = [start]
+    distance = 0
+    steps = ((N, -columns), (S, columns), (E, 1), (W, -1))
+    while frontier:
+        distance += 1
+        reached = []
+        for index in frontier:
+            bits = links[index]
+            for bit, step in steps:
+                if bits & bit and cells[index + step] < 0:
+                    cells[index + step] = distance
+                    reached.append(index + step)
+        frontier = reached
+    return cells
+
+
+def longest_path(grid, start=None):
+    """
+    Distances along one of the longest paths of a perfect maze.
+
+    The farthest cell from any start is one end of a longest path, and the
+    farthest cell from that end is the other one.
+    """
+    if start is None:
+        start = next(grid.each_cell())
+    new_start, _ = Distances(grid, start).max()
+    distances = Distances(grid, new_start)
+    goal, _ = distances.max()
+    return distances.path_to(goal)
+
+
+def main():
+    import growing_tree
+    import maze
+    grid = maze.Grid(10, 10)
+    gt = growing_tree.GrowingTree(grid)
+    gt.build_maze(grid)
+    grid.distances = Distances(grid, grid[0, 0])
+    print(grid)
+    grid.distances = longest_path(grid)
+    print(grid)
+    grid.write_svg('./exports/distances.svg')
+
+if __name__ == "__main__":
+    main()
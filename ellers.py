@@ -0,0 +1,103 @@
+import random
+import sys
+import render
+from compact_grid import N, S, E, W
+
+class Ellers:
+    """
+    Eller's algorithm, generating a perfect maze one row at a time.
+
+    Only the set labels of the current row are kept, so memory is
+    O(columns) however many rows are produced.  each_row() yields the
+    N/S/E/W link bits of every finished row (the same layout as
+    CompactGrid.links), which the render module can stream to a file.
+    """
+
+    def find(self, parent, label):
+        while parent[label] != label:
+            parent[label] = parent[parent[label]]
+            label = parent[label]
+        return label
+
+    def each_row(self):
+        columns = self.columns
+        sets = list(range(columns))
+        down = bytearray(columns)
+
+        for r in range(self.rows):
+            last = r == self.rows - 1
+            row = bytearray(N if d else 0 for d in down)
+
+            # join neighbouring cells of different sets, all of them on the
+            # last row so that the maze ends up connected
+            parent = list(range(columns))
+            for c in range(columns - 1):
+                a = self.find(parent, sets[c])
+                b = self.find(parent, sets[c + 1])
+                if a != b and (last or self.rng.randrange(2)):
+                    row[c] |= E
+                    row[c + 1] |= W
+                    parent[b] = a
+
+            if last:
+                yield row
+                return
+
+            # carve down from a random subset of every set, at least one
+            # cell per set, picking that one uniformly if none was drawn
+            labels = [self.find(parent, label) for label in sets]
+            down = bytearray(self.rng.randrange(2) for _ in range(columns))
+            seen = {}
+            chosen = {}
+            carried = set()
+            for c, label in enumerate(labels):
+                if down[c]:
+                    carried.add(label)
+                seen[label] = seen.get(label, 0) + 1
+                if self.rng.randrange(seen[label]) == 0:
+                    chosen[label] = c
+            for label, c in chosen.items():
+                if label not in carried:
+                    down[c] = 1
+            for c in range(columns):
+                if down[c]:
+                    row[c] |= S
+            yield row
+
+            # cells below keep their set, the others start new ones; labels
+            # are renumbered so they always stay below columns
+            remap = {}
+            for c in range(columns):
+                if down[c]:
+                    sets[c] = remap.setdefault(labels[c], len(remap))
+            fresh = len(remap)
+            for c in range(columns):
+                if not down[c]:
+                    sets[c] = fresh
+                    fresh += 1
+
+    def build_maze(self, grid):
+        for row, links in zip(grid.each_row(), self.each_row()):
+            for cell, bits in zip(row, links):
+                if bits & E:
+                    cell.link(cell.east())
+                if bits & S:
+                    cell.link(cell.south())
+
+    def __init__(self, rows, columns, rng=random):
+        self.rows = rows
+        self.columns = columns
+        self.rng = rng
+
+
+def main():
+    ellers = Ellers(10, 10)
+    render.write_ascii(ellers.each_row(), ellers.columns, sys.stdout)
+
+def main_svg():
+    ellers = Ellers(10000, 100)
+    with open('./exports/ellers.svg', 'w') as out:
+        render.write_svg(ellers.each_row(), ellers.rows, ellers.columns, out)
+
+if __name__ == "__main__":
+    main()
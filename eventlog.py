@@ -0,0 +1,140 @@
+"""
+Append-only record of how a generator built a maze, for replay and
+animation.
+
+Every event is one unsigned 32-bit integer in an array('I'): the flat
+index row * columns + column of a cell shifted left by SHIFT, or'ed with
+the direction code of a new passage from it, or with RESTART where a new
+tree is seeded.  Generators that accept a log (GrowingTree, Wilsons) fetch
+its append method once and check for None before each link, so building
+without a log costs nothing and recording adds a shift and an append.
+
+    log = eventlog.EventLog(grid)
+    growing_tree.GrowingTree(grid, log=log).build_maze(grid)
+    halfway = log.replay(len(log) // 2)
+    for step, raster in log.frames(every=100):
+        raster.save('./exports/frame%06d.png' % step)
+"""
+from array import array
+import numpy as np
+import compact_grid
+import maze
+import mazefile
+import raster
+from compact_grid import N, S, E, W, MASKED
+
+SHIFT = 3
+# direction codes, index into BITS and OPPOSITES
+NORTH, SOUTH, EAST, WEST = range(4)
+RESTART = 4
+BITS = np.array([N, S, E, W], dtype=np.uint8)
+OPPOSITES = np.array([S, N, W, E], dtype=np.uint8)
+
+
+class EventLog:
+
+    def __init__(self, grid):
+        # take the masked positions from the grid before it is built
+        self.rows = grid.rows
+        self.columns = grid.columns
+        self.base = compact_grid.link_array(grid) & MASKED
+        self.events = array('I')
+        # for generators packing events in their inner loops
+        self.shift = SHIFT
+        columns = self.columns
+        # flat index step -> direction code; with one column, +-1 is north
+        # or south, so those are added last
+        self.steps = {1: EAST, -1: WEST, -columns: NORTH, columns: SOUTH}
+
+    def __len__(self):
+        return len(self.events)
+
+    def link(self, a, b):
+        """ Record a passage between the adjacent flat indices a and b """
+        self.events.append(a << SHIFT | self.steps[b - a])
+
+    def restart(self, index):
+        """ Record the seeding of a new tree at flat index index """
+        self.events.append(index << SHIFT | RESTART)
+
+    def decode(self, start=0, stop=None):
+        """ (cells, codes) NumPy arrays of events start .. stop """
+        events = np.frombuffer(self.events, dtype=np.uint32)[start:stop]
+        return (events >> SHIFT).astype(np.intp), events & ((1 << SHIFT) - 1)
+
+    def restarts(self):
+        """ Steps at which a new tree was seeded """
+        return np.flatnonzero(self.decode()[1] == RESTART)
+
+    def link_bits(self, step=None):
+        """ (rows, columns) array of link bits after the first step events """
+        links = self.base.copy().reshape(-1)
+        cells, codes = self.decode(0, step)
+        passage = codes < RESTART
+        cells, codes = cells[passage], codes[passage]
+        offsets = np.array([-self.columns, self.columns, 1, -1], dtype=np.intp)
+        # a cell gets at most one bit per direction, so plain or'ing is safe
+        # even when a cell appears several times
+        np.bitwise_or.at(links, cells, BITS[codes])
+        np.bitwise_or.at(links, cells + offsets[codes], OPPOSITES[codes])
+        return links.reshape(self.rows, self.columns)
+
+    def replay(self, step=None, cls=maze.Grid):
+        """ The maze after the first step events, as a grid of class cls """
+        return mazefile.from_links(self.link_bits(step), cls)
+
+    def frames(self, every=1, cell_size=10, wall_width=2, start=0):
+        """
+        Yield (step, Raster) after every `every` events from start on, and
+        after the last one.  The same Raster is updated in place by
+        clearing the wall between the two cells of each new passage, so a
+        frame must be saved or copied before the next one is taken.
+        """
+        image = raster.Raster(self.rows, self.columns, cell_size, wall_width)
+        image.paint(self.link_bits(start))
+        pixels = image.pixels
+        columns, cs, ww = self.columns, cell_size, wall_width
+        background = raster.BACKGROUND_COLOR
+        yield start, image
+        step = start
+        for event in self.events[start:]:
+            step += 1
+            code = event & ((1 << SHIFT) - 1)
+            if code != RESTART:
+                row, column = divmod(event >> SHIFT, columns)
+                # turn north and west passages into the neighbor's south and east
+                if code == NORTH:
+                    row, code = row - 1, SOUTH
+                elif code == WEST:
+                    column, code = column - 1, EAST
+                top, left = row * cs, column * cs
+                if code == SOUTH:
+                    pixels[top + cs:top + cs + ww, left + ww:left + cs] = background
+                else:
+                    pixels[top + ww:top + cs, left + cs:left + cs + ww] = background
+            if step % every == 0:
+                yield step, image
+        if step % every:
+            yield step, image
+
+
+def main():
+    import time
+    import growing_tree
+    grid = compact_grid.CompactGrid(200, 200)
+    start = time.perf_counter()
+    growing_tree.GrowingTree(grid).build_maze(grid)
+    plain = time.perf_counter() - start
+
+    grid = compact_grid.CompactGrid(200, 200)
+    log = EventLog(grid)
+    start = time.perf_counter()
+    growing_tree.GrowingTree(grid, log=log).build_maze(grid)
+    logged = time.perf_counter() - start
+    print("%d events, %d bytes, generation %.3f s, with log %.3f s" % (
+        len(log), len(log.events) * log.events.itemsize, plain, logged))
+    for step, image in log.frames(every=len(log) // 4):
+        image.save('./exports/growth%06d.png' % step)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+A maze's passages as a graph in NumPy arrays.
+
+Cells are identified by their flat index row * columns + column.  Masked
+positions are not part of the graph: to_csr() numbers the cells of the
+maze 0 .. n - 1 in flat index order and returns the flat index of every
+node, so its arrays can go straight into scipy.sparse.csr_matrix or
+numeric code.  Everything is computed from the link bits of
+compact_grid.link_array() with whole-array operations.
+"""
+import numpy as np
+import compact_grid
+from compact_grid import N, S, E, W, MASKED
+
+# neighbor directions in increasing flat index order, so that every row
+# of the CSR arrays comes out sorted
+ORDER = (N, W, E, S)
+
+# number of passages of a cell, by link byte
+DEGREE = np.array([bin(bits & (N | S | E | W)).count("1") for bits in range(256)], dtype=np.int64)
+
+
+def edge_list(grid, renumber=False):
+    """
+    (a, b) NumPy int32 arrays with one entry per passage, a < b: east
+    passages first, then south ones.  Cells are flat indices, or node
+    numbers as in to_csr() with renumber.
+    """
+    links = compact_grid.link_array(grid)
+    columns = grid.columns
+    flat = links.reshape(-1)
+    index = np.arange(flat.size, dtype=np.int32)
+    # a masked position has only the MASKED bit, so it never matches E or S
+    east = index[(flat & E) != 0]
+    south = index[(flat & S) != 0]
+    a = np.concatenate([east, south])
+    b = np.concatenate([east + 1, south + columns])
+    if renumber:
+        node_of = node_numbers(flat)
+        a, b = node_of[a], node_of[b]
+    return a, b
+
+
+def node_numbers(flat):
+    """ Node number of every flat index, -1 for masked positions """
+    present = (flat & MASKED) == 0
+    node_of = np.full(flat.size, -1, dtype=np.int32)
+    node_of[present] = np.arange(np.count_nonzero(present), dtype=np.int32)
+    return node_of
+
+
+def to_csr(grid):
+    """
+    The maze as a CSR adjacency structure (indptr, indices, nodes).
+
+    Node k is the cell at flat index nodes[k]; its neighbors are
+    indices[indptr[k]:indptr[k + 1]], in increasing order.  Every passage
+    appears twice, once from each end.
+    """
+    links = compact_grid.link_array(grid)
+    columns = grid.columns
+    flat = links.reshape(-1)
+    present = (flat & MASKED) == 0
+    nodes = np.flatnonzero(present).astype(np.int32)
+    cells = flat[present]
+
+    steps = {N: -columns, W: -1, E: 1, S: columns}
+    has = np.stack([(cells & bit) != 0 for bit in ORDER], axis=1)
+    neighbors = nodes[:, None] + np.array([steps[bit] for bit in ORDER], dtype=np.int32)
+
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(DEGREE[cells], out=indptr[1:])
+    # row-major selection keeps each node's neighbors together, in ORDER
+    indices = neighbors[has]
+    if len(nodes) < flat.size:
+        indices = node_numbers(flat)[indices]
+    return indptr, indices, nodes
+
+
+def main():
+    import time
+    import vectorized
+    grid = compact_grid.CompactGrid(2000, 2000)
+    vectorized.VectorizedSidewinder(grid).build_maze(grid)
+    start = time.perf_counter()
+    indptr, indices, nodes = to_csr(grid)
+    print("CSR of %d cells, %d passages in %.3f s" % (len(nodes), len(indices) // 2,
+                                                       time.perf_counter() - start))
+    degree = np.diff(indptr)
+    print("dead ends: %d, junctions: %d" % (np.count_nonzero(degree == 1),
+                                            np.count_nonzero(degree > 2)))
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,153 @@
 import random
 import maze
+import profiling
 
 CHOOSE     = 'newest'
 #CHOOSE     = 'random'
+# Mixes list several strategies separated by '/', one of them is picked
+# at random on every step, e.g.
+#CHOOSE     = 'newest/random'
+
+# compact the active list once this many retired cells sit at its front
+COMPACT_AFTER = 1024
+
+def strategies(choose=None):
+    """ The strategies of a CHOOSE string, the module-wide one by default """
+    return (choose or CHOOSE).split('/')
+
 
 class GrowingTree:
 
-    def choose_index(self, ceil):
-        if CHOOSE == 'newest':
+    @property
+    def choose(self):
+        return self.mix
+
+    @choose.setter
+    def choose(self, choose):
+        # parsed right away, so that grow_tree works without build_maze
+        self.mix = choose
+        self.strategies = strategies(choose)
+
+    def choose_index(self, head, ceil):
+        strategy = self.strategies[0]
+        if len(self.strategies) > 1:
+            strategy = self.rng.choice(self.strategies)
+        if strategy == 'newest':
             return ceil-1
-        if CHOOSE == 'oldest':
-            return 0
-        if CHOOSE == 'random':
-            return random.randint(0, ceil-1)
+        if strategy == 'oldest':
+            return head
+        if strategy == 'random':
+            return self.rng.randrange(head, ceil)
         # or implement your own!
-        
+        raise ValueError("unknown growing tree strategy %r" % strategy)
+
+    @profiling.timed('growing_tree.grow_tree')
     def grow_tree(self, grid, cell):
-        #column, row = random.randint(0, grid.columns-1), random.randint(0, grid.rows-1)
-        cells = []
-        #cells = cells + [grid[column][row]]
-        cells = cells + [grid.random_cell()]
-
-        while cells:
-            #print(grid)
-            found_unvisited_neighbor = False
-            index = self.choose_index(len(cells))
-            #column, row = cells[index]
-
-            cell = cells[index] # grid[column][row]
-            neighbors = cell.get_available_neighbors()
-            random.shuffle(neighbors)
-            #print("choosing from: ", neighbors)
-            for n in neighbors:
-                #print("looking at: ", n, n.get_visited(), index)
-                if not n.get_visited():
-                    #print("linking!")
-                    cell.link(n)
-                    n.set_visited()
-                    cell.set_visited()
-                    cells = cells + [n] # [[n.column, n.row]]
-                    found_unvisited_neighbor = True
-                    break;
-
-            if not found_unvisited_neighbor:
-                #print("deleting", index)
-                del cells[index]
-
-    def find_unlinked_cells(self, grid):
+        """ Grow a spanning tree over every cell reachable from cell """
+        cell.set_visited()
+        if self.log is not None:
+            self.log.restart(cell.row * grid.columns + cell.column)
+        self.grow(cell, self.expander(grid))
+
+    def expander(self, grid):
+        """
+        A function that links a cell to a random unvisited neighbor and
+        returns it, or returns None when every neighbor is visited
+        """
+        choice = self.rng.choice
+        log = self.log
+        if log is not None:
+            columns, steps, shift = grid.columns, log.steps, log.shift
+            record = log.events.append
+
+        def expand(cell):
+            neighbors = [n for n in cell.get_available_neighbors()
+                         if not n.get_visited()]
+            if not neighbors:
+                return None
+            n = choice(neighbors)
+            cell.link(n)
+            if log is not None:
+                index = cell.row * columns + cell.column
+                record(index << shift | steps[n.row * columns + n.column - index])
+            n.set_visited()
+            return n
+        return expand
+
+    def grow(self, cell, expand):
+        """
+        The growing tree loop from a visited cell, over any kind of cells:
+        expand(cell) adds a passage to a new cell and returns it, or None.
+
+        The active cells live in one list: live entries are cells[head:].
+        Retiring the oldest cell only moves head forward, the newest is
+        popped and any other index is swap-removed with the last entry, so
+        every step is O(1) whatever the strategy.
+        """
+        cells = [cell]
+        head = 0
+        # statistics, only kept while profiling
+        profile = profiling.ACTIVE
+        retired = peak = 0
+
+        while head < len(cells):
+            index = self.choose_index(head, len(cells))
+            n = expand(cells[index])
+            if n is not None:
+                cells.append(n)
+                continue
+            if profile is not None:
+                retired += 1
+                peak = max(peak, len(cells) - head)
+            if index == head:
+                cells[head] = None
+                head += 1
+                if head >= COMPACT_AFTER and 2 * head >= len(cells):
+                    del cells[:head]
+                    head = 0
+            else:
+                last = cells.pop()
+                if index < len(cells):
+                    cells[index] = last
+
+        if profile is not None:
+            # every cell of the tree is retired once, all but the first
+            # were reached through a new link
+            profile.count('growing_tree.links', retired - 1)
+            profile.peak('growing_tree.active_cells', peak)
+
+    def find_unvisited_cells(self, grid):
+        """
+        Yield the cells not reached by any tree yet.
+
+        This is a single pass over the grid that the caller resumes after
+        each tree, so seeding all regions of a masked grid costs O(cells)
+        in total.
+        """
         for cell in grid.each_cell():
-            if (not cell.is_linked(cell.north()) and
-                not cell.is_linked(cell.east()) and
-                not cell.is_linked(cell.west()) and
-                not cell.is_linked(cell.south())):
-                return cell
-        return False
+            if not cell.get_visited():
+                yield cell
 
+    @profiling.timed('growing_tree.build_maze')
     def build_maze(self, grid):
-        cell = grid.random_cell()
-        self.grow_tree(grid, cell)
-        while cell:
-            cell = self.find_unlinked_cells(grid)
+        self.grow_tree(grid, grid.random_cell(self.rng))
+        unvisited = self.find_unvisited_cells(grid)
+        profile = profiling.ACTIVE
+        if profile is not None:
+            unvisited = profile.timed_iter('growing_tree.seed_scan', unvisited)
+        for cell in unvisited:
+            if profile is not None:
+                profile.count('growing_tree.seed_restarts')
             self.grow_tree(grid, cell)
 
 
-    def __init__(self, grid):
+    def __init__(self, grid, rng=random, choose=None, log=None):
+        # rng is the random module or a seeded random.Random, choose
+        # overrides the module-wide CHOOSE strategy and log is an
+        # eventlog.EventLog recording every link
+        self.rng = rng
+        self.choose = choose
+        self.log = log
         grid.reload_cells()
         
 
@@ -0,0 +1,164 @@
+"""
+Image readers that only need the standard library and NumPy.
+
+They let masks be loaded on headless servers without pygame.  Both return
+a (height, width, channels) uint8 array with one (gray) or three (RGB)
+channels; alpha is dropped and palettes are expanded.
+"""
+import struct
+import zlib
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG color type -> samples per pixel
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+class UnsupportedImage(ValueError):
+    pass
+
+
+def read_image(filename):
+    """ Read a PNG or a PGM/PPM (binary or plain) file """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    try:
+        if data.startswith(PNG_SIGNATURE):
+            return decode_png(data)
+        if data[:2] in (b"P2", b"P3", b"P5", b"P6"):
+            return decode_pnm(data)
+    except (struct.error, zlib.error, IndexError, TypeError) as error:
+        # truncated or corrupt data
+        raise UnsupportedImage("%s is not a valid image: %s" % (filename, error))
+    raise UnsupportedImage("%s is neither a PNG nor a PGM/PPM file" % filename)
+
+
+def decode_pnm(data):
+    magic = data[:2]
+    # header: magic, width, height, maxval, separated by whitespace with
+    # '#' comments running to the end of the line
+    fields = []
+    pos = 2
+    while len(fields) < 3:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b"#":
+            pos = data.index(b"\n", pos)
+            continue
+        end = pos
+        while not data[end:end + 1].isspace():
+            end += 1
+        fields.append(int(data[pos:end]))
+        pos = end
+    width, height, maxval = fields
+    channels = 3 if magic in (b"P3", b"P6") else 1
+    count = width * height * channels
+
+    if magic in (b"P5", b"P6"):
+        # exactly one whitespace byte separates the header from the raster
+        dtype = np.uint8 if maxval < 256 else np.dtype('>u2')
+        samples = np.frombuffer(data, dtype=dtype, count=count, offset=pos + 1)
+    else:
+        samples = np.array(data[pos:].split()[:count], dtype=np.int64)
+    if maxval != 255:
+        samples = samples.astype(np.int64) * 255 // maxval
+    return samples.astype(np.uint8).reshape(height, width, channels)
+
+
+def decode_png(data):
+    pos = len(PNG_SIGNATURE)
+    idat = []
+    palette = None
+    header = None
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif kind == b"PLTE":
+            palette = np.frombuffer(body, dtype=np.uint8).reshape(-1, 3)
+        elif kind == b"IDAT":
+            idat.append(body)
+        elif kind == b"IEND":
+            break
+
+    width, height, depth, color_type, _, _, interlace = header
+    if interlace or color_type not in PNG_CHANNELS:
+        raise UnsupportedImage("interlaced or unknown PNG color type")
+    if depth < 8 and color_type not in (0, 3):
+        raise UnsupportedImage("unsupported PNG bit depth %d" % depth)
+    channels = PNG_CHANNELS[color_type]
+    bits_per_pixel = channels * depth
+    unit = max(1, bits_per_pixel // 8)
+    stride = (width * bits_per_pixel + 7) // 8
+
+    raw = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8)
+    raw = raw[:height * (stride + 1)].reshape(height, stride + 1)
+    rows = unfilter(raw[:, 1:], raw[:, 0], unit)
+
+    if depth == 16:
+        samples = rows.reshape(height, width, channels, 2)[..., 0]
+    elif depth == 8:
+        samples = rows.reshape(height, width, channels)
+    else:
+        bits = np.unpackbits(rows, axis=1).reshape(height, -1, depth)
+        weights = 1 << np.arange(depth - 1, -1, -1, dtype=np.uint8)
+        samples = (bits * weights).sum(axis=2, dtype=np.uint8)[:, :width, None]
+        if color_type == 0:
+            samples = samples * np.uint8(255 // ((1 << depth) - 1))
+
+    if color_type == 3:
+        return palette[samples[..., 0]]
+    if color_type in (4, 6):
+        samples = samples[..., :-1]
+    return np.ascontiguousarray(samples)
+
+
+def unfilter(filtered, filters, unit):
+    """
+    Undo the per-scanline PNG filters.
+
+    None, Sub and Up are vectorized per row; Average and Paeth depend on
+    the byte just reconstructed to their left and run byte by byte.
+    """
+    height, stride = filtered.shape
+    rows = np.zeros((height, stride), dtype=np.uint8)
+    previous = np.zeros(stride, dtype=np.uint8)
+    for y in range(height):
+        line = filtered[y]
+        kind = filters[y]
+        if kind == 0:
+            rows[y] = line
+        elif kind == 1:
+            padded = np.zeros(-(-stride // unit) * unit, dtype=np.uint8)
+            padded[:stride] = line
+            rows[y] = np.cumsum(padded.reshape(-1, unit), axis=0,
+                                dtype=np.uint8).reshape(-1)[:stride]
+        elif kind == 2:
+            rows[y] = line + previous
+        elif kind in (3, 4):
+            out = bytearray(line.tobytes())
+            up = previous.tobytes()
+            for i in range(stride):
+                a = out[i - unit] if i >= unit else 0
+                b = up[i]
+                if kind == 3:
+                    out[i] = (out[i] + ((a + b) >> 1)) & 0xff
+                    continue
+                c = up[i - unit] if i >= unit else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                if pa <= pb and pa <= pc:
+                    predictor = a
+                elif pb <= pc:
+                    predictor = b
+                else:
+                    predictor = c
+                out[i] = (out[i] + predictor) & 0xff
+            rows[y] = np.frombuffer(out, dtype=np.uint8)
+        else:
+            raise UnsupportedImage("unknown PNG filter type %d" % kind)
+        previous = rows[y]
+    return rows
@@ -0,0 +1,192 @@
+"""
+Randomized Kruskal's algorithm over flat cell indices.
+
+Every wall between two cells is a candidate edge; the edges are shuffled
+and a wall is removed whenever its two cells are still in different sets
+of a DisjointSet.  In tiled mode each tile's spanning forest is built in
+a worker process, and the main process only runs Kruskal over the edges
+on the seams between tiles, starting from the sets the tiles returned.
+"""
+import multiprocessing
+import random
+from array import array
+import numpy as np
+import compact_grid
+from compact_grid import N, S, E, W
+
+
+class DisjointSet:
+    """
+    Union-find over the integers 0 .. size - 1, with path compression and
+    union by rank, kept in flat arrays
+    """
+
+    def __init__(self, size):
+        self.parent = array('i', range(size))
+        self.rank = bytearray(size)
+
+    @staticmethod
+    def from_labels(labels):
+        """
+        Sets from a NumPy array giving every element the root of its set
+        """
+        labels = np.asarray(labels, dtype=np.int32)
+        sets = DisjointSet(0)
+        sets.parent = array('i', labels.tobytes())
+        sets.rank = bytearray((np.bincount(labels, minlength=labels.size) > 1)
+                              .astype(np.uint8).tobytes())
+        return sets
+
+    def find(self, i):
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, a, b):
+        """ Merge the sets of a and b, False if they were already one set """
+        parent = self.parent
+        while parent[a] != a:
+            parent[a] = a = parent[parent[a]]
+        while parent[b] != b:
+            parent[b] = b = parent[parent[b]]
+        if a == b:
+            return False
+        rank = self.rank
+        if rank[a] < rank[b]:
+            a, b = b, a
+        parent[b] = a
+        if rank[a] == rank[b]:
+            rank[a] += 1
+        return True
+
+    def labels(self):
+        """ NumPy array of the root of every element's set """
+        find = self.find
+        return np.array([find(i) for i in range(len(self.parent))], dtype=np.int32)
+
+
+def candidate_edges(present):
+    """
+    (a, b) NumPy arrays of the flat indices of every pair of horizontally
+    (b == a + 1) or vertically (b == a + columns) adjacent present cells
+    """
+    rows, columns = present.shape
+    index = np.arange(rows * columns, dtype=np.int32).reshape(rows, columns)
+    east = index[:, :-1][present[:, :-1] & present[:, 1:]]
+    south = index[:-1, :][present[:-1, :] & present[1:, :]]
+    return np.concatenate([east, south]), np.concatenate([east + 1, south + columns])
+
+
+def kruskal(sets, a, b):
+    """ Boolean NumPy array of the edges, in order, that join two sets """
+    union = sets.union
+    accepted = bytearray(len(a))
+    for k, (x, y) in enumerate(zip(a.tolist(), b.tolist())):
+        if union(x, y):
+            accepted[k] = 1
+    return np.frombuffer(accepted, dtype=bool)
+
+
+def edge_links(shape, a, b):
+    """ (rows, columns) array of the N/S/E/W bits of edges (a, b) """
+    links = np.zeros(shape[0] * shape[1], dtype=np.uint8)
+    # test for south edges, one column wide tiles have b == a + 1 there too
+    south = b - a == shape[1]
+    links[a[south]] |= S
+    links[b[south]] |= N
+    links[a[~south]] |= E
+    links[b[~south]] |= W
+    return links.reshape(shape)
+
+
+def spanning_forest(present, generator, labels=False):
+    """
+    Links of a random spanning forest of the present cells and, if labels
+    is true, the flat index of the root of every cell's tree
+    """
+    a, b = candidate_edges(present)
+    order = generator.permutation(len(a))
+    a, b = a[order], b[order]
+    sets = DisjointSet(present.size)
+    accepted = kruskal(sets, a, b)
+    links = edge_links(present.shape, a[accepted], b[accepted])
+    return links, sets.labels() if labels else None
+
+
+def build_tile(job):
+    """
+    Worker: (links, global root index of every cell) of one tile.
+
+    job is (present, seed, top, left, columns), columns being the width
+    of the whole grid.
+    """
+    present, seed, top, left, columns = job
+    links, labels = spanning_forest(present, np.random.default_rng(seed), labels=True)
+    row, column = np.divmod(labels, present.shape[1])
+    return links, (top + row) * columns + left + column
+
+
+class Kruskals:
+
+    def build_maze(self, grid):
+        present = compact_grid.presence(grid)
+        if self.tile_size:
+            links = self.tiled_links(present)
+        else:
+            links, _ = spanning_forest(present, self.generator())
+        compact_grid.link_all(grid, links)
+
+    def generator(self):
+        # NumPy shuffles the edges; seed it from rng so that a seeded
+        # random.Random still gives the same maze every time
+        return np.random.default_rng(self.rng.getrandbits(64))
+
+    def tiled_links(self, present):
+        rows, columns = present.shape
+        size = self.tile_size
+        jobs = []
+        for top in range(0, rows, size):
+            for left in range(0, columns, size):
+                tile = np.ascontiguousarray(present[top:top + size, left:left + size])
+                jobs.append((tile, self.rng.getrandbits(64), top, left, columns))
+        with multiprocessing.Pool(self.processes) as pool:
+            tiles = pool.map(build_tile, jobs)
+
+        links = np.zeros((rows, columns), dtype=np.uint8)
+        labels = np.zeros((rows, columns), dtype=np.int32)
+        for (_, _, top, left, _), (tile_links, tile_labels) in zip(jobs, tiles):
+            height, width = tile_links.shape
+            links[top:top + height, left:left + width] = tile_links
+            labels[top:top + height, left:left + width] = tile_labels.reshape(height, width)
+
+        # only the edges crossing a tile boundary are left to decide
+        a, b = candidate_edges(present)
+        row, column = np.divmod(a, columns)
+        seam = np.where(b - a == columns, row % size == size - 1, column % size == size - 1)
+        a, b = a[seam], b[seam]
+        order = self.generator().permutation(len(a))
+        a, b = a[order], b[order]
+        accepted = kruskal(DisjointSet.from_labels(labels.reshape(-1)), a, b)
+        return links | edge_links(present.shape, a[accepted], b[accepted])
+
+    def __init__(self, grid, rng=random, tile_size=None, processes=None):
+        # with tile_size, tiles of tile_size x tile_size cells are built
+        # by a pool of processes (cpu_count() when processes is None)
+        self.rng = rng
+        self.tile_size = tile_size
+        self.processes = processes
+        grid.reload_cells()
+
+
+def main():
+    grid = compact_grid.CompactGrid(10, 10)
+    kruskals = Kruskals(grid)
+    kruskals.build_maze(grid)
+    print(grid)
+
+if __name__ == "__main__":
+    main()
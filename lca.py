@@ -0,0 +1,244 @@
+"""
+Constant time distance queries on perfect mazes.
+
+The passages of a perfect maze form a tree (a forest when a mask splits it
+into regions), so the distance between two cells is
+depth[a] + depth[b] - 2 * depth[lowest common ancestor].  TreeIndex
+roots each tree, records parents and depths with one iterative traversal
+and answers lowest common ancestor queries with a range minimum over the
+depth-first order:
+
+    for a != b with pre[a] < pre[b], the lowest common ancestor is the
+    parent of a shallowest cell among order[pre[a] + 1 .. pre[b]]
+
+which needs n entries where an Euler tour needs 2n - 1.  The range
+minimum is split into blocks of BLOCK entries: prefix and suffix minima
+inside every block plus a sparse table over the block minima, about
+3n + (n / BLOCK) log(n / BLOCK) integers instead of n log n.
+
+Cells are flat indices row * columns + column, as in graph.py.
+"""
+import numpy as np
+import compact_grid
+import graph
+
+BLOCK = 32
+# key of the entries no query should pick
+NONE = np.iinfo(np.int64).max
+
+
+class TreeIndex:
+
+    def __init__(self, grid):
+        indptr, indices, nodes = graph.to_csr(grid)
+        n = len(nodes)
+        self.columns = grid.columns
+        self.nodes = nodes
+        self.node_of = graph.node_numbers(compact_grid.link_array(grid).reshape(-1))
+
+        parent, depth, order, tree = traverse(indptr.tolist(), indices.tolist(), n)
+        roots = parent.count(-1)
+        if len(indices) // 2 != n - roots:
+            raise ValueError("the maze has loops: it is not a tree")
+        self.parent = np.array(parent, dtype=np.int32)
+        self.depth = np.array(depth, dtype=np.int32)
+        self.tree = np.array(tree, dtype=np.int32)
+        order = np.array(order, dtype=np.int32)
+        self.pre = np.empty(n, dtype=np.int32)
+        self.pre[order] = np.arange(n, dtype=np.int32)
+
+        # (depth of the parent, parent) packed so that one minimum gives both
+        parents = self.parent[order].astype(np.int64)
+        blocks = -(-n // BLOCK)
+        key = np.full(blocks * BLOCK, NONE, dtype=np.int64)
+        key[:n] = np.where(parents >= 0, (self.depth[order] - 1).astype(np.int64) << 32 | parents, NONE)
+        self.key = key
+        rows = key.reshape(blocks, BLOCK)
+        self.prefix = np.minimum.accumulate(rows, axis=1).reshape(-1)
+        self.suffix = np.minimum.accumulate(rows[:, ::-1], axis=1)[:, ::-1].reshape(-1)
+        # table[k][i] is the minimum of blocks i .. i + 2**k - 1
+        self.table = [rows.min(axis=1)]
+        span = 1
+        while 2 * span <= blocks:
+            previous = self.table[-1]
+            self.table.append(np.minimum(previous[:-span], previous[span:]))
+            span *= 2
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node(self, cell):
+        node = int(self.node_of[cell])
+        if node < 0:
+            raise ValueError("cell %d is masked" % cell)
+        return node
+
+    def node_array(self, cells):
+        """ Node numbers of a NumPy array of cells, which must not be masked """
+        cells = np.asarray(cells, dtype=np.int64)
+        nodes = self.node_of[cells]
+        masked = cells[nodes < 0]
+        if len(masked):
+            raise ValueError("cell %d is masked" % masked[0])
+        return nodes
+
+    def range_min(self, first, last):
+        """ Smallest key in positions first .. last of the depth-first order """
+        left, right = first // BLOCK, last // BLOCK
+        if left == right:
+            return int(self.key[first:last + 1].min())
+        best = min(self.suffix[first], self.prefix[last])
+        if right - left > 1:
+            level = (right - left - 1).bit_length() - 1
+            row = self.table[level]
+            best = min(best, row[left + 1], row[right - (1 << level)])
+        return int(best)
+
+    def ancestor(self, a, b):
+        """ Node number of the lowest common ancestor of nodes a and b """
+        if a == b:
+            return a
+        if self.tree[a] != self.tree[b]:
+            return -1
+        first, last = sorted((int(self.pre[a]), int(self.pre[b])))
+        return self.range_min(first + 1, last) & 0xffffffff
+
+    def connected_ancestor(self, a, b):
+        """ ancestor() of cells a and b, raising ValueError if there is none """
+        ancestor = self.ancestor(self.node(a), self.node(b))
+        if ancestor < 0:
+            raise ValueError("cells %d and %d are not connected" % (a, b))
+        return ancestor
+
+    def lca(self, a, b):
+        """ Flat index of the lowest common ancestor of cells a and b """
+        return int(self.nodes[self.connected_ancestor(a, b)])
+
+    def distance(self, a, b):
+        """ Number of steps between cells a and b """
+        ancestor = self.connected_ancestor(a, b)
+        a, b = self.node(a), self.node(b)
+        depth = self.depth
+        return int(depth[a]) + int(depth[b]) - 2 * int(depth[ancestor])
+
+    def path(self, a, b):
+        """ Flat indices of the cells from a to b, both included """
+        ancestor = self.connected_ancestor(a, b)
+        a, b = self.node(a), self.node(b)
+        parent = self.parent
+        up, down = [a], [b]
+        while up[-1] != ancestor:
+            up.append(int(parent[up[-1]]))
+        while down[-1] != ancestor:
+            down.append(int(parent[down[-1]]))
+        down.pop()
+        return self.nodes[up + down[::-1]].tolist()
+
+    def ancestors(self, a, b):
+        """ lca() of arrays of node numbers, -1 where they are not connected """
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        if (a < 0).any() or (b < 0).any():
+            raise ValueError("node numbers must not be negative")
+        first = np.minimum(self.pre[a], self.pre[b]).astype(np.int64) + 1
+        last = np.maximum(self.pre[a], self.pre[b]).astype(np.int64)
+        # a == b gives first > last and keeps NONE
+        best = np.full(first.shape, NONE, dtype=np.int64)
+        left, right = first // BLOCK, last // BLOCK
+
+        inside = (left == right) & (first <= last)
+        start, stop = first[inside], last[inside]
+        found = best[inside]
+        for offset in range(BLOCK):
+            position = np.minimum(start + offset, len(self.key) - 1)
+            found = np.where(start + offset <= stop, np.minimum(found, self.key[position]), found)
+        best[inside] = found
+
+        across = left < right
+        first, last = first[across], last[across]
+        left, right = left[across], right[across]
+        found = np.minimum(self.suffix[first], self.prefix[last])
+        gap = right - left - 1
+        for level, row in enumerate(self.table):
+            # queries whose inner blocks are covered by two spans of 2**level
+            chosen = (gap >= 1 << level) & (gap < 2 << level)
+            if chosen.any():
+                low, high = left[chosen] + 1, right[chosen] - (1 << level)
+                found[chosen] = np.minimum(found[chosen], np.minimum(row[low], row[high]))
+        best[across] = found
+
+        ancestor = np.where(best == NONE, a, best & 0xffffffff)
+        return np.where(self.tree[a] == self.tree[b], ancestor, -1)
+
+    def lcas(self, a, b):
+        """
+        lca() of NumPy arrays of cells, -1 where they are not connected;
+        raises ValueError if a cell is masked
+        """
+        ancestor = self.ancestors(self.node_array(a), self.node_array(b))
+        return np.where(ancestor >= 0, self.nodes[ancestor], -1)
+
+    def distances(self, a, b):
+        """
+        distance() of NumPy arrays of cells, -1 where they are not
+        connected; raises ValueError if a cell is masked
+        """
+        a, b = self.node_array(a), self.node_array(b)
+        ancestor = self.ancestors(a, b)
+        depth = self.depth.astype(np.int64)
+        result = depth[a] + depth[b] - 2 * depth[ancestor]
+        return np.where(ancestor >= 0, result, -1)
+
+
+def traverse(indptr, indices, n):
+    """
+    Iterative depth-first traversal of a forest in CSR form: the lists
+    (parent, depth, order, tree) with parent -1 at the roots, order the
+    nodes in preorder and tree the root every node hangs from.
+    """
+    parent = [-1] * n
+    depth = [0] * n
+    tree = [0] * n
+    seen = bytearray(n)
+    order = []
+    push = order.append
+    for root in range(n):
+        if seen[root]:
+            continue
+        seen[root] = 1
+        tree[root] = root
+        stack = [root]
+        pop, put = stack.pop, stack.append
+        while stack:
+            node = pop()
+            push(node)
+            below = depth[node] + 1
+            for k in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[k]
+                if not seen[neighbor]:
+                    seen[neighbor] = 1
+                    parent[neighbor] = node
+                    depth[neighbor] = below
+                    tree[neighbor] = root
+                    put(neighbor)
+    return parent, depth, order, tree
+
+
+def main():
+    import time
+    import growing_tree
+    grid = compact_grid.CompactGrid(1000, 1000)
+    growing_tree.GrowingTree(grid).build_maze(grid)
+    start = time.perf_counter()
+    index = TreeIndex(grid)
+    print("index of %d cells in %.3f s" % (len(index), time.perf_counter() - start))
+    rng = np.random.default_rng(1)
+    a = rng.integers(0, len(index), 1000000)
+    b = rng.integers(0, len(index), 1000000)
+    start = time.perf_counter()
+    distances = index.distances(a, b)
+    print("%d distances in %.3f s, mean %.1f" % (len(a), time.perf_counter() - start, distances.mean()))
+    print("corner to corner:", index.distance(0, len(index) - 1))
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,90 @@
 import random
+from array import array
+from contextlib import contextmanager
 import svgwrite
+import profiling
 from svgwrite import cm, mm   
 
+# direction -> (row offset, column offset) of the neighbor
+NEIGHBOR_OFFSETS = {'north': (-1, 0), 'south': (1, 0), 'east': (0, 1), 'west': (0, -1)}
+
 class Cell:
+    """
+    A cell of a Grid.  Neighbors are not stored: they are looked up in the
+    grid from (row, column) when asked for, unless set_neighbors() pinned
+    one explicitly.
+    """
+    __slots__ = ('row', 'column', 'grid', 'links', 'visited', 'overrides')
 
-    def __init__(self, row, column):
+    def __init__(self, row, column, grid=None):
 
         self.row = row
         self.column = column
+        self.grid = grid
 
         self.links = {}
         self.visited = False
-        self.neighbors = {'north': None, 'south': None, 'east': None, 'west': None}
-
+        # neighbors set with set_neighbors(), created on first use
+        self.overrides = None
+
+    def neighbor(self, direction):
+        if self.overrides is not None and direction in self.overrides:
+            return self.overrides[direction]
+        if self.grid is None:
+            return None
+        drow, dcol = NEIGHBOR_OFFSETS[direction]
+        return self.grid[self.row + drow, self.column + dcol]
+
+    # north() .. west() are called once per cell by generators such as
+    # BinaryTree, so they read the grid's rows directly unless a neighbor
+    # was pinned with set_neighbors()
     def north(self):
-        return self.neighbors['north']
-    
+        grid = self.grid
+        if self.overrides is not None or grid is None:
+            return self.neighbor('north')
+        if self.row > 0:
+            return grid.grid[self.row - 1][self.column]
+
     def south(self):
-        return self.neighbors['south']
-    
+        grid = self.grid
+        if self.overrides is not None or grid is None:
+            return self.neighbor('south')
+        if self.row + 1 < grid.rows:
+            return grid.grid[self.row + 1][self.column]
+
     def east(self):
-        return self.neighbors['east']
-    
+        grid = self.grid
+        if self.overrides is not None or grid is None:
+            return self.neighbor('east')
+        if self.column + 1 < grid.columns:
+            return grid.grid[self.row][self.column + 1]
+
     def west(self):
-        return self.neighbors['west']
+        grid = self.grid
+        if self.overrides is not None or grid is None:
+            return self.neighbor('west')
+        if self.column > 0:
+            return grid.grid[self.row][self.column - 1]
+
+    @property
+    def neighbors(self):
+        return {direction: self.neighbor(direction) for direction in NEIGHBOR_OFFSETS}
     
     def get_neighbors(self):
         return self.neighbors
 
     def get_available_neighbors(self):
-        ret = []
-        for dir in self.neighbors:
-            if self.neighbors[dir]:
-                ret = ret + [self.neighbors[dir]]
-        return ret
+        if self.overrides is not None or self.grid is None:
+            return [n for n in map(self.neighbor, NEIGHBOR_OFFSETS) if n]
+        # hot path of the generators, the lookups of neighbor() inlined
+        grid, row, column = self.grid, self.row, self.column
+        return [n for n in (grid[row - 1, column], grid[row + 1, column],
+                            grid[row, column + 1], grid[row, column - 1]) if n]
 
     def set_neighbors(self, key, value=None):
-        self.neighbors[key] = value
+        if self.overrides is None:
+            self.overrides = {}
+        self.overrides[key] = value
 
     def get_visited(self):
         return self.visited
@@ -70,6 +118,16 @@ class Cell:
         return "Cell row %s column %s" % (self.row, self.column)
 
 
+def to_base36(number):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    text = ""
+    while True:
+        number, digit = divmod(number, 36)
+        text = digits[digit] + text
+        if not number:
+            return text
+
+
 class Grid:
 
     def __init__(self, rows, columns):
@@ -77,63 +135,39 @@ class Grid:
         self.columns = columns
         self.grid = []
 
-        self.rowcount = 0
-        self.cellcount = 0
+        # Distances (see distances.py) shown by contents_of and
+        # background_color_for when set
+        self.distances = None
 
         self.prepare_grid()
         self.configure_cells()
                     
+    @profiling.timed('grid.prepare_grid')
     def prepare_grid(self):
         for i in range(self.rows):
-            self.grid.append([Cell(i, j) for j in range(self.columns)])
+            self.grid.append([Cell(i, j, self) for j in range(self.columns)])
 
+    @profiling.timed('grid.configure_cells')
     def configure_cells(self):
-        for i in range(self.rows):
-            for j in range(self.columns):
-                cell = self.grid[i][j]
-                if not cell == None:
-                    cell.set_neighbors('north', value=self[cell.row-1, cell.column])
-                    cell.set_neighbors('south', value=self[cell.row+1, cell.column])
-                    cell.set_neighbors('west', value=self[cell.row, cell.column-1])
-                    cell.set_neighbors('east', value=self[cell.row, cell.column+1])
+        # Cells look their neighbors up on demand through __getitem__,
+        # so there is nothing to precompute
+        pass
 
     def __getitem__(self, key):
         if type(key)==int:
-            if 0 <= key < self.rows and 0 <= key < self.columns:
+            if 0 <= key < self.rows:
                 return self.grid[key]
         else:
-            if 0 <= key[0] < self.rows and 0 <= key[1] < self.columns:
-                return self.grid[key[0]][key[1]]
+            row, column = key
+            if 0 <= row < self.rows and 0 <= column < self.columns:
+                return self.grid[row][column]
 
-    def random_cell(self):
-        return self[random.randrange(0, self.rows), random.randrange(0, self.columns)]
+    def random_cell(self, rng=random):
+        return self[rng.randrange(0, self.rows), rng.randrange(0, self.columns)]
 
     def __len__(self):
         return self.rows*self.columns
 
-    def each_row(self, forward=True):
-        if forward:
-            while self.rowcount < self.rows:
-                self.rowcount += 1
-                yield self.grid[self.rowcount-1]
-        else:
-            while self.rowcount > 0:
-                self.rowcount -= 1
-                yield self.grid[self.rowcount]
-
-    def reload_rows(self):
-        self.rowcount = 0
-
-    def each_cell(self, forward=True):
-        if forward:
-            while self.cellcount < len(self):
-                self.cellcount +=1
-                yield self.grid[(self.cellcount-1)//self.rows][(self.cellcount-1) % self.columns]
-        else:
-            while self.cellcount > 0:
-                self.cellcount -=1
-                yield self.grid[(self.cellcount)//self.rows][(self.cellcount) % self.columns]
-
     def each_row(self):
         """
         Iterate over each row in the grid
@@ -151,56 +185,146 @@ class Grid:
                 # be present at a specific (row, column)
                 if cell:
                     yield cell
-                    
-                    
+
+    def reload_rows(self):
+        # each_row is a plain generator now, there is no cursor to rewind
+        pass
+
     def reload_cells(self):
-        self.cellcount = 0
+        # each_cell is a plain generator now, there is no cursor to rewind
+        pass
+
+    def reset(self):
+        """
+        Remove every link and visited flag so that the grid can host a new
+        maze, reusing its cells
+        """
+        for cell in self.each_cell():
+            cell.links.clear()
+            cell.visited = False
+        self.distances = None
+
+    def link_rows(self):
+        """
+        Iterate over the N/S/E/W link bits of each row (see compact_grid),
+        the format consumed by the render module
+        """
+        from compact_grid import N, S, E, W, MASKED
+        for row in self.each_row():
+            links = bytearray(len(row))
+            for k, cell in enumerate(row):
+                if not cell:
+                    links[k] = MASKED
+                    continue
+                bits = 0
+                for other in cell.links:
+                    if other.row < cell.row:
+                        bits |= N
+                    elif other.row > cell.row:
+                        bits |= S
+                    elif other.column > cell.column:
+                        bits |= E
+                    else:
+                        bits |= W
+                links[k] = bits
+            yield links
+
+    def write_svg(self, out, cell_size=10, wall_width=2):
+        """
+        Write the maze as SVG in a single pass, with the wall scheme of
+        to_svg but merged wall segments and no in-memory drawing.
+        out is a file name or an open text file.
+
+        Without a mask both draw exactly the same walls.  Next to masked
+        positions to_svg also outlines some wall corners in red, while
+        write_svg only draws red where a wall meets the outside, so its
+        walls are a subset of those of to_svg there.
+        """
+        import render
+        if isinstance(out, str):
+            with open(out, 'w') as f:
+                self.write_svg(f, cell_size, wall_width)
+            return
+        fills = ([self.background_color_for(cell) if cell else None for cell in row]
+                 for row in self.each_row())
+        render.write_svg(self.link_rows(), self.rows, self.columns, out,
+                         cell_size, wall_width, fills=fills)
+
+    def to_csr(self):
+        """
+        The passages as CSR adjacency arrays (indptr, indices, nodes) over
+        the cells of the maze, see graph.to_csr
+        """
+        import graph
+        return graph.to_csr(self)
+
+    def edge_list(self, renumber=False):
+        """ The passages as two arrays of flat cell indices, see graph.edge_list """
+        import graph
+        return graph.edge_list(self, renumber)
+
+    def save(self, filename):
+        """
+        Write the maze in the compact binary format of mazefile.py
+        """
+        import mazefile
+        mazefile.save(self, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Read a maze written by save().  Grid.load gives a Grid, or a
+        MaskedGrid if the file has a mask; CompactGrid.load a CompactGrid.
+        """
+        import mazefile
+        return mazefile.load(filename, cls)
 
     def contents_of(self, cell):
+        if self.distances is not None and self.distances[cell] is not None:
+            return to_base36(self.distances[cell])
         return " "
 
     def background_color_for(self, cell):
-        return None
+        """
+        Heat map of self.distances: white at the root, darker green
+        further away
+        """
+        if self.distances is None or self.distances[cell] is None:
+            return None
+        farthest = self.distances.max()[1] or 1
+        intensity = (farthest - self.distances[cell]) / farthest
+        dark = round(255 * intensity)
+        bright = 128 + round(127 * intensity)
+        return "rgb(%d,%d,%d)" % (dark, bright, dark)
 
     def __repr__(self):
         return "Grid (%r,%r)" % (self.rows, self.columns)
 
-    def __str__(self):
-        #return "Grid row %s column %s" % (self.rows, self.columns)
-        output = "+" + "---+" * self.columns +"\n"
-        self.reload_rows()
+    def labels(self):
+        """ The 3-character contents of the cells of each row """
         for row in self.each_row():
-            eastboundary = ""
-            southboundary = ""
-            for cellid in range(len(row)):
-
-                if cellid == 0:
-                    eastboundary +="|"
-                else:
-                    if row[cellid] and  row[cellid].is_linked(row[cellid-1]):
-                        eastboundary += " "
-                    else:
-                        eastboundary += "|"
-                eastboundary += "   "
+            yield [self.contents_of(cell).center(3)[:3] if cell else "   " for cell in row]
 
-                if row[cellid] and row[cellid].neighbors['south']:
-                    if row[cellid].is_linked(row[cellid].neighbors['south']):
-                        southboundary += "+   "
-                    else:
-                        southboundary += "+---"
-                else:
-                    southboundary += "+---"
-
-            eastboundary += "|\n"
-            southboundary += "+\n"
-
-            output += eastboundary
-            output += southboundary
+    def write_ascii(self, out, style='ascii'):
+        """
+        Write the maze as text to a text file, one row at a time; style is
+        one of render.TEXT_STYLES
+        """
+        import render
+        labels = self.labels() if self.distances is not None else None
+        render.write_ascii(self.link_rows(), self.columns, out, style, labels)
 
-        return output
+    def to_ascii(self, style='ascii'):
+        import render
+        labels = self.labels() if self.distances is not None else None
+        return "".join(render.text_lines(self.link_rows(), self.columns, style, labels))
 
+    def __str__(self):
+        return self.to_ascii()
 
-    def to_svg(self, cell_size = 10):
+    @profiling.timed('grid.to_svg')
+    def to_svg(self, cell_size = 10, filename = './exports/maze.svg'):
+        # filename can also be an open text file, e.g. an io.StringIO
         wall_width = 2
         top_offset = 0#wall_width
         left_offset = 0#wall_width
@@ -209,7 +333,8 @@ class Grid:
         draw_outer_walls = True
         img_width = cell_size * self.columns + top_offset * 2 + wall_width
         img_height = cell_size * self.rows + left_offset * 2 + wall_width
-        dwg = svgwrite.Drawing('./exports/maze.svg', size=(img_width*mm, img_height*mm))
+        dwg = svgwrite.Drawing(filename if isinstance(filename, str) else 'maze.svg',
+                              size=(img_width*mm, img_height*mm))
         
         for cell in self.each_cell():
             x1 = cell.column * cell_size + top_offset + wall_width
@@ -219,6 +344,11 @@ class Grid:
 
             #print(cell)
 
+            color = self.background_color_for(cell)
+            if color:
+                dwg.add(dwg.rect(insert=(x1*mm, y1*mm), size=((x2-x1)*mm, (y2-y1)*mm),
+                                 fill=color))
+
             if draw_outer_walls:
                 # outermost walls
                 if not cell.north():
@@ -402,7 +532,13 @@ class Grid:
                                  stroke=inner_wall_color, stroke_width=1*mm))
             
 
-        dwg.save()
+        if profiling.ACTIVE is not None:
+            # everything but the <defs> element svgwrite starts with
+            profiling.ACTIVE.count('svg.elements', len(dwg.elements) - 1)
+        if isinstance(filename, str):
+            dwg.save()
+        else:
+            dwg.write(filename)
 
 
         
@@ -413,74 +549,219 @@ class MaskedGrid(Grid):
 
     
     # Overriden method from Grid class
+    @profiling.timed('grid.prepare_grid')
     def prepare_grid(self):
-        print("preparing masked grid")
+        bits = self.mask.bits
         for i in range(self.rows):
-            self.grid.append([Cell(i, j) if self.mask[i, j] else None for j in range(self.columns)])
+            row_bits = bits[i * self.columns:(i + 1) * self.columns]
+            self.grid.append([Cell(i, j, self) if on else None for j, on in enumerate(row_bits)])
                                                                 
-    def random_cell(self):
-        row, col = self.mask.random_location()
+    def random_cell(self, rng=random):
+        row, col = self.mask.random_location(rng)
         return self.grid[row][col]
 
 
+class GridPool:
+    """
+    Released grids kept per size, so that high-volume generation can reuse
+    them (after a reset()) instead of allocating a new grid for each maze.
+
+        pool = GridPool(CompactGrid)
+        with pool.grid(50, 50) as grid:
+            GrowingTree(grid).build_maze(grid)
+            ...
+    """
+
+    def __init__(self, grid_class=Grid, max_per_size=4):
+        self.grid_class = grid_class
+        self.max_per_size = max_per_size
+        self.free = {}
+
+    def acquire(self, rows, columns):
+        """ An empty rows x columns grid, recycled when possible """
+        free = self.free.get((rows, columns))
+        if free:
+            grid = free.pop()
+            grid.reset()
+            return grid
+        return self.grid_class(rows, columns)
+
+    def release(self, grid):
+        """ Hand a grid back; it is dropped if enough are already kept """
+        free = self.free.setdefault((grid.rows, grid.columns), [])
+        if len(free) < self.max_per_size:
+            free.append(grid)
+
+    @contextmanager
+    def grid(self, rows, columns):
+        grid = self.acquire(rows, columns)
+        try:
+            yield grid
+        finally:
+            self.release(grid)
+
+
+class IndexSet:
+    """
+    Set of the integers in range(size) with O(1) add, discard and uniform
+    random choice.
+
+    Members are packed at the front of an array, and where[i] records the
+    slot of member i (-1 if absent) so that it can be swap-removed.
+    """
+
+    def __init__(self, size, full=False):
+        self.size = size
+        if full:
+            import numpy as np
+            members = np.arange(size, dtype=np.int32).tobytes()
+            self.members = array('i', members)
+            self.where = array('i', members)
+        else:
+            self.members = array('i')
+            self.where = array('i', [-1]) * size
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, i):
+        return self.where[i] >= 0
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def add(self, i):
+        if self.where[i] < 0:
+            self.where[i] = len(self.members)
+            self.members.append(i)
+
+    def discard(self, i):
+        slot = self.where[i]
+        if slot >= 0:
+            last = self.members.pop()
+            if last != i:
+                self.members[slot] = last
+                self.where[last] = slot
+            self.where[i] = -1
+
+    def fill(self, members):
+        """
+        Replace the contents with the distinct indices of a NumPy int array
+        """
+        import numpy as np
+        members = np.asarray(members, dtype=np.int32)
+        where = np.full(self.size, -1, dtype=np.int32)
+        where[members] = np.arange(len(members), dtype=np.int32)
+        self.members = array('i', members.tobytes())
+        self.where = array('i', where.tobytes())
+
+    def choice(self, rng=random):
+        """ A uniformly chosen member, in exactly one draw """
+        return self.members[rng.randrange(len(self.members))]
+
+
 class Mask:
+    """
+    On/off bitmap over a grid, stored row by row in a flat bytearray with
+    one 0/1 byte per position.  The first random_location builds an
+    IndexSet of the flat indices of the positions that are on, kept up to
+    date from then on, so that every location takes one draw.
+    """
+
+    # pixels with every color component at or below this are masked out
+    DARK_THRESHOLD = 50
+
     def __init__(self, n_rows, n_columns):
         self.n_rows = n_rows
         self.n_columns = n_columns
-        self.bits = [[True for _ in range(n_columns)] for _ in range(n_rows)]
+        self.bits = bytearray(b"\x01") * (n_rows * n_columns)
+        # IndexSet of the positions that are on, None until first needed
+        self.enabled = None
+
+    @property
+    def index(self):
+        if self.enabled is None:
+            import numpy as np
+            self.enabled = IndexSet(len(self.bits))
+            self.enabled.fill(np.flatnonzero(np.frombuffer(self.bits, dtype=np.uint8)))
+        return self.enabled
 
     def __getitem__(self, pos):
         """ Get a Boolean value from this mask for the specified position """
         row, column = pos
-        if row <= self.n_rows-1 and column <= self.n_columns-1:
-            return self.bits[row][column]
+        if 0 <= row < self.n_rows and 0 <= column < self.n_columns:
+            return bool(self.bits[row * self.n_columns + column])
         else:
             return False
         
     def __setitem__(self, pos, is_on):
         """ Set a Boolean value in this Mask at specified position """
         row, column = pos
-        self.bits[row][column] = is_on
+        index = row * self.n_columns + column
+        if self.enabled is not None:
+            if is_on:
+                self.enabled.add(index)
+            else:
+                self.enabled.discard(index)
+        self.bits[index] = 1 if is_on else 0
 
     def count(self):
         """ Count the number of True values in this mask """
-        return sum([self.bits[x][y] for x in range(self.n_rows)
-                                    for y in range(self.n_columns)])
+        return len(self.bits) - self.bits.count(0)
 
-    def random_location(self):
-        while True:
-            row = random.randint(0, self.n_rows-1)
-            col = random.randint(0, self.n_columns-1)
-            if self.bits[row][col]:
-                return row, col
+    def random_location(self, rng=random):
+        """ A uniformly chosen (row, column) that is on """
+        if not self.index:
+            raise ValueError("mask has no enabled positions")
+        return divmod(self.index.choice(rng), self.n_columns)
 
     def __str__(self):
-        ret = ""
-        for row in range(0, self.n_rows):
-            for col in range(0, self.n_columns):
-                if self.bits[row][col]:
-                    ret = ret + "."
-                else:
-                    ret = ret + "X"
-            ret = ret + "\n"
-        return ret
+        text = self.bits.translate(bytes.maketrans(b"\x00\x01", b"X."))
+        return "".join(text[i:i + self.n_columns].decode() + "\n"
+                       for i in range(0, len(text), self.n_columns))
 
     @staticmethod
-    def from_image(img_file):
-        import pygame
-        surface = pygame.image.load(img_file)
-        mask = Mask(surface.get_height(), surface.get_width())
-        print("mask ")
-        print(surface.get_height())
-        print(surface.get_width())
-        for row in range(0, mask.n_rows):
-            for col in range(0, mask.n_columns):
-                color = surface.get_at((col, row))
-                if color.r <= 50 and color.g <= 50 and color.b <= 50:
-                    mask[row, col] = False
-                else:
-                    mask[row, col] = True
+    def from_array(pixels):
+        """
+        Build a mask from a (rows, columns[, channels]) NumPy pixel array:
+        positions whose color components are all <= DARK_THRESHOLD are off
+        """
+        import numpy as np
+        pixels = np.asarray(pixels)
+        n_rows, n_columns = pixels.shape[:2]
+        colors = pixels.reshape(n_rows, n_columns, -1)[:, :, :3]
+        return Mask.from_bools(np.any(colors > Mask.DARK_THRESHOLD, axis=2))
+
+    @staticmethod
+    def from_bools(on):
+        """ Build a mask from a (rows, columns) NumPy array of booleans """
+        import numpy as np
+        on = np.asarray(on, dtype=bool)
+        mask = Mask(*on.shape)
+        mask.bits[:] = on.astype(np.uint8).tobytes()
         return mask
 
+    @staticmethod
+    @profiling.timed('mask.from_image')
+    def from_image(img_file):
+        """
+        Load a mask from an image through pygame.  Without pygame, as on
+        headless servers, PNG and PGM/PPM files are decoded by the images
+        module instead; it is much slower on PNGs using the Average and
+        Paeth filters.  Files that cannot be decoded raise ValueError.
+        """
+        try:
+            import pygame
+        except ImportError:
+            import images
+            return Mask.from_array(images.read_image(img_file))
+        try:
+            surface = pygame.image.load(img_file)
+        except pygame.error as error:
+            # undecodable images fail alike with or without pygame
+            raise ValueError("cannot load %s: %s" % (img_file, error))
+        # surfarray is indexed (x, y), masks are (row, column)
+        return Mask.from_array(pygame.surfarray.array3d(surface).swapaxes(0, 1))
+
 if __name__ == '__main__':
     pass
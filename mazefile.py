@@ -0,0 +1,188 @@
+"""
+Compact, versioned binary format for rectangular mazes.
+
+    header   magic b"MAZE", version, flags, rows, columns   (struct HEADER)
+    mask     if flags & HAS_MASK: one bit per cell, 1 = part of the maze
+    links    two bits per cell: bit 0 = linked east, bit 1 = linked south
+
+Cells are stored row by row and bits are packed starting from the least
+significant bit of each byte, four cells per links byte.  North and west
+links follow from the neighbouring cells, so a 10000 x 10000 maze takes
+25 MB.  MazeFile memory-maps a file to read single cells without
+parsing the rest of it.
+"""
+import mmap
+import struct
+import numpy as np
+import compact_grid
+import maze
+from compact_grid import N, S, E, W, MASKED
+
+MAGIC = b"MAZE"
+VERSION = 1
+HAS_MASK = 1
+HEADER = struct.Struct('<4sHHII')
+
+
+def mask_size(rows, columns):
+    return (rows * columns + 7) // 8
+
+
+def links_size(rows, columns):
+    return (rows * columns + 3) // 4
+
+
+def dumps(grid):
+    """ The maze of any Grid as bytes """
+    links = compact_grid.link_array(grid).reshape(-1)
+    present = (links & MASKED) == 0
+    flags = 0 if present.all() else HAS_MASK
+
+    pairs = np.zeros(links_size(grid.rows, grid.columns) * 4, dtype=np.uint8)
+    pairs[:links.size] = ((links & E) != 0) | (((links & S) != 0) << 1)
+    pairs = pairs.reshape(-1, 4)
+    packed = pairs[:, 0] | (pairs[:, 1] << 2) | (pairs[:, 2] << 4) | (pairs[:, 3] << 6)
+
+    parts = [HEADER.pack(MAGIC, VERSION, flags, grid.rows, grid.columns)]
+    if flags & HAS_MASK:
+        parts.append(np.packbits(present, bitorder='little').tobytes())
+    parts.append(packed.tobytes())
+    return b"".join(parts)
+
+
+def read_header(data):
+    """
+    (flags, rows, columns) of dumps() output; ValueError if it is not a
+    maze file or is shorter than its header says
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("truncated maze file")
+    magic, version, flags, rows, columns = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a maze file")
+    if version != VERSION:
+        raise ValueError("unsupported maze file version %d" % version)
+    size = HEADER.size + links_size(rows, columns)
+    if flags & HAS_MASK:
+        size += mask_size(rows, columns)
+    if len(data) < size:
+        raise ValueError("truncated maze file")
+    return flags, rows, columns
+
+
+def link_array(data):
+    """ (rows, columns) array of N/S/E/W/MASKED bits from dumps() output """
+    flags, rows, columns = read_header(data)
+    size = rows * columns
+    offset = HEADER.size
+    if flags & HAS_MASK:
+        present = np.unpackbits(np.frombuffer(data, np.uint8, mask_size(rows, columns), offset),
+                                bitorder='little')[:size].astype(bool)
+        offset += mask_size(rows, columns)
+    else:
+        present = np.ones(size, dtype=bool)
+
+    packed = np.frombuffer(data, np.uint8, links_size(rows, columns), offset)
+    pairs = np.stack([(packed >> shift) & 3 for shift in (0, 2, 4, 6)], axis=1)
+    pairs = pairs.reshape(-1)[:size].reshape(rows, columns)
+    east = pairs & 1
+    south = pairs >> 1
+
+    links = east * np.uint8(E) | south * np.uint8(S)
+    links[:, 1:] |= east[:, :-1] * np.uint8(W)
+    links[1:, :] |= south[:-1, :] * np.uint8(N)
+    links[~present.reshape(rows, columns)] = MASKED
+    return links
+
+
+def loads(data, cls=maze.Grid):
+    """ Rebuild a maze from dumps() output, see from_links() """
+    return from_links(link_array(data), cls)
+
+
+def from_links(links, cls=maze.Grid):
+    """
+    Build a maze from a (rows, columns) array of link bits.  A CompactGrid
+    class gets the link bits directly; otherwise a Grid (or a MaskedGrid
+    when the maze has a mask) is built and its cells linked.
+    """
+    rows, columns = links.shape
+    present = (links & MASKED) == 0
+
+    if issubclass(cls, compact_grid.CompactGrid):
+        mask = None if present.all() else maze.Mask.from_bools(present)
+        grid = cls(rows, columns, mask)
+        grid.links[:] = links.tobytes()
+        return grid
+
+    if issubclass(cls, maze.MaskedGrid) or not present.all():
+        grid = maze.MaskedGrid(maze.Mask.from_bools(present))
+    else:
+        grid = cls(rows, columns)
+    compact_grid.link_all(grid, links)
+    return grid
+
+
+def save(grid, filename):
+    with open(filename, 'wb') as f:
+        f.write(dumps(grid))
+
+
+def load(filename, cls=maze.Grid):
+    with open(filename, 'rb') as f:
+        return loads(f.read(), cls)
+
+
+class MazeFile:
+    """
+    Read-only, memory-mapped view of a saved maze.
+
+    Opening only parses the header; links(row, column) reads the two or
+    three bytes that describe one cell.
+    """
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.flags, self.rows, self.columns = read_header(self.data)
+        self.links_offset = HEADER.size
+        if self.flags & HAS_MASK:
+            self.links_offset += mask_size(self.rows, self.columns)
+
+    def present(self, row, column):
+        """ True if (row, column) is a cell of the maze """
+        if not (0 <= row < self.rows and 0 <= column < self.columns):
+            return False
+        if not self.flags & HAS_MASK:
+            return True
+        index = row * self.columns + column
+        return bool(self.data[HEADER.size + (index >> 3)] >> (index & 7) & 1)
+
+    def pair(self, row, column):
+        """ east (bit 0) and south (bit 1) links of a cell """
+        index = row * self.columns + column
+        return self.data[self.links_offset + (index >> 2)] >> (2 * (index & 3)) & 3
+
+    def links(self, row, column):
+        """ N/S/E/W link bits of a cell, MASKED if it is not in the maze """
+        if not self.present(row, column):
+            return MASKED
+        pair = self.pair(row, column)
+        bits = (E if pair & 1 else 0) | (S if pair & 2 else 0)
+        if row > 0 and self.pair(row - 1, column) & 2:
+            bits |= N
+        if column > 0 and self.pair(row, column - 1) & 1:
+            bits |= W
+        return bits
+
+    def __getitem__(self, pos):
+        return self.links(*pos)
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,133 @@
+"""
+Optional instrumentation of maze building and rendering.
+
+Phases (Mask.from_image, prepare_grid, grow_tree, ...) are decorated with
+timed(); inside a profiling() block they add their wall time and a call
+to the active Profile, and generators add counters such as links created
+or seed restarts.  Outside such a block ACTIVE is None: a timed phase
+costs one global lookup per call, and generators fetch ACTIVE once before
+their loops, never inside them.
+
+    with profiling.profiling() as profile:
+        grid = maze.MaskedGrid(maze.Mask.from_image('mask.png'))
+        growing_tree.GrowingTree(grid).build_maze(grid)
+    print(profile)
+"""
+import functools
+import time
+from contextlib import contextmanager
+
+# the Profile being recorded, None when instrumentation is off
+ACTIVE = None
+
+
+class Profile:
+
+    def __init__(self):
+        # phase -> [calls, seconds]
+        self.phases = {}
+        self.counters = {}
+        self.peaks = {}
+
+    def add_time(self, phase, seconds, calls=1):
+        entry = self.phases.setdefault(phase, [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def timed_iter(self, name, iterable):
+        """ Iterate, adding the time spent in each next() to phase name """
+        iterator = iter(iterable)
+        perf_counter = time.perf_counter
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, perf_counter() - start)
+                return
+            self.add_time(name, perf_counter() - start)
+            yield item
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def peak(self, name, value):
+        if value > self.peaks.get(name, value - 1):
+            self.peaks[name] = value
+
+    def report(self):
+        """ The recorded data as a dict of plain values, e.g. for JSON """
+        return {
+            'phases': {name: {'calls': calls, 'seconds': seconds}
+                       for name, (calls, seconds) in self.phases.items()},
+            'counters': dict(self.counters),
+            'peaks': dict(self.peaks),
+        }
+
+    def __str__(self):
+        lines = ["%-32s %8s %10s" % ('phase', 'calls', 'seconds')]
+        for name, (calls, seconds) in sorted(self.phases.items(), key=lambda item: -item[1][1]):
+            lines.append("%-32s %8d %10.4f" % (name, calls, seconds))
+        for title, values in (('counter', self.counters), ('peak', self.peaks)):
+            if values:
+                lines.append("")
+                lines.append("%-32s %8s" % (title, 'value'))
+                for name, value in sorted(values.items()):
+                    lines.append("%-32s %8d" % (name, value))
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiling(profile=None):
+    """ Record into profile (a new Profile by default) within the block """
+    global ACTIVE
+    previous = ACTIVE
+    ACTIVE = profile if profile is not None else Profile()
+    try:
+        yield ACTIVE
+    finally:
+        ACTIVE = previous
+
+
+def timed(name):
+    """ Decorator recording the calls and wall time of a function as phase name """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = ACTIVE
+            if profile is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.add_time(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def main():
+    # as a script this module is __main__, a different module object from
+    # the profiling that the instrumented modules import
+    import profiling
+    import growing_tree
+    import maze
+    import numpy as np
+    y, x = np.ogrid[:300, :300]
+    on = ((y - 150) ** 2 + (x - 150) ** 2 <= 150 ** 2) & (np.random.default_rng(1).random((300, 300)) > 0.2)
+    with profiling.profiling() as profile:
+        grid = maze.MaskedGrid(maze.Mask.from_bools(on))
+        growing_tree.GrowingTree(grid).build_maze(grid)
+        grid.write_svg('./exports/profiled.svg')
+    print(profile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Bitmap rendering of mazes into a NumPy pixel buffer.
+
+The image uses the block layout of the SVG renderers: cell_size pixels per
+cell, of which the first wall_width rows and columns belong to the wall
+lattice (corners and the gaps between cells).  Every part of the lattice
+is painted in one vectorized assignment, and the PGM/PNG encoders only
+need the standard library.
+"""
+import struct
+import zlib
+import numpy as np
+import compact_grid
+from compact_grid import N, W, MASKED
+
+WALL_COLOR = 0
+BACKGROUND_COLOR = 255
+
+
+class Raster:
+
+    def __init__(self, rows, columns, cell_size=10, wall_width=2):
+        if not 0 < wall_width < cell_size:
+            raise ValueError("wall_width must be between 0 and cell_size")
+        self.rows = rows
+        self.columns = columns
+        self.cell_size = cell_size
+        self.wall_width = wall_width
+        self.height = rows * cell_size + wall_width
+        self.width = columns * cell_size + wall_width
+        self.pixels = np.full((self.height, self.width), BACKGROUND_COLOR, dtype=np.uint8)
+
+    def shade(self, walls):
+        return np.where(walls, WALL_COLOR, BACKGROUND_COLOR).astype(np.uint8)
+
+    def paint(self, links):
+        """
+        Paint the maze described by a (rows, columns) array of link bits
+        """
+        rows, columns = self.rows, self.columns
+        cs, ww = self.cell_size, self.wall_width
+        links = np.asarray(links, dtype=np.uint8).reshape(rows, columns)
+
+        present = np.zeros((rows + 2, columns + 2), dtype=bool)
+        present[1:-1, 1:-1] = (links & MASKED) == 0
+        # corners[i, j] sits north-west of cell (i, j), vertical[i, j] west
+        # of it and horizontal[i, j] north of it; a lattice block is wall
+        # when it touches a cell of the maze and is not a passage
+        corners = (present[:-1, :-1] | present[:-1, 1:] |
+                   present[1:, :-1] | present[1:, 1:])
+        vertical = present[1:-1, :-1] | present[1:-1, 1:]
+        vertical[:, :-1] &= (links & W) == 0
+        horizontal = present[:-1, 1:-1] | present[1:, 1:-1]
+        horizontal[:-1, :] &= (links & N) == 0
+
+        corners = self.shade(corners)
+        vertical = self.shade(vertical)
+        horizontal = self.shade(horizontal)
+
+        pixels = self.pixels
+        body = np.lib.stride_tricks.as_strided(
+            pixels, shape=(rows, cs, columns, cs),
+            strides=(cs * self.width, self.width, cs, 1))
+        body[:, :ww, :, :ww] = corners[:-1, None, :-1, None]
+        body[:, ww:, :, :ww] = vertical[:, None, :-1, None]
+        body[:, :ww, :, ww:] = horizontal[:-1, None, :, None]
+        body[:, ww:, :, ww:] = BACKGROUND_COLOR
+
+        east = pixels[:rows * cs, columns * cs:].reshape(rows, cs, ww)
+        east[:, :ww] = corners[:-1, -1, None, None]
+        east[:, ww:] = vertical[:, -1, None, None]
+        south = pixels[rows * cs:, :columns * cs].reshape(ww, columns, cs)
+        south[:, :, :ww] = corners[-1, :-1, None]
+        south[:, :, ww:] = horizontal[-1, :, None]
+        pixels[rows * cs:, columns * cs:] = corners[-1, -1]
+        return self
+
+    def memoryview(self):
+        """ Zero-copy (height, width) view of the pixels, one byte each """
+        return memoryview(self.pixels)
+
+    def to_pgm(self):
+        header = b"P5\n%d %d\n255\n" % (self.width, self.height)
+        return header + self.pixels.tobytes()
+
+    def to_png(self, level=1):
+        def chunk(kind, data):
+            return (struct.pack(">I", len(data)) + kind + data +
+                    struct.pack(">I", zlib.crc32(kind + data)))
+
+        # every scanline starts with filter type 0 (none)
+        raw = np.zeros((self.height, self.width + 1), dtype=np.uint8)
+        raw[:, 1:] = self.pixels
+        header = struct.pack(">IIBBBBB", self.width, self.height, 8, 0, 0, 0, 0)
+        return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) +
+                chunk(b"IDAT", zlib.compress(raw.tobytes(), level)) +
+                chunk(b"IEND", b""))
+
+    def save(self, filename):
+        """ Write a .png or .pgm file, depending on the extension """
+        data = self.to_pgm() if filename.lower().endswith('.pgm') else self.to_png()
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+
+def render(grid, cell_size=10, wall_width=2):
+    """ Raster image of a Grid, MaskedGrid or CompactGrid """
+    raster = Raster(grid.rows, grid.columns, cell_size, wall_width)
+    return raster.paint(compact_grid.link_array(grid))
+
+
+def main():
+    import growing_tree
+    grid = compact_grid.CompactGrid(20, 30)
+    gt = growing_tree.GrowingTree(grid)
+    gt.build_maze(grid)
+    render(grid).save('./exports/maze.png')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Renderers that consume a maze one row at a time.
+
+A row is a bytes-like sequence with the N/S/E/W link bits of its cells
+(MASKED for positions outside the maze), as yielded by Ellers.each_row()
+or Grid.link_rows().  Nothing is kept beyond the current and previous
+rows, so arbitrarily tall mazes can be written straight to a file or
+socket.
+"""
+import profiling
+from compact_grid import S, E, W, MASKED
+
+OUTER_WALL_COLOR = 'red'
+INNER_WALL_COLOR = 'black'
+
+# The SVG image is a grid of (2 * rows + 1) x (2 * columns + 1) blocks:
+# cells at odd positions, the gaps between them (wall_width wide) at even
+# ones.  Every block is open floor, wall or outside the maze, and lines are
+# drawn where floor meets wall (inner walls) and where wall meets the
+# outside (outer walls).
+OPEN, WALL, OUT = 0, 1, 2
+
+EDGE_COLORS = {(OPEN, WALL): INNER_WALL_COLOR, (WALL, OPEN): INNER_WALL_COLOR,
+               (WALL, OUT): OUTER_WALL_COLOR, (OUT, WALL): OUTER_WALL_COLOR}
+
+
+# Text styles: 'ascii' is the +---+ format of Grid.__str__, 'unicode'
+# draws the same walls with box-drawing characters and 'compact' uses one
+# character per cell showing the passages leaving it.
+TEXT_STYLES = ['ascii', 'unicode', 'compact']
+
+# segments indexed by a cell's link byte, so a line is one join of
+# precomputed strings
+ASCII_CELLS = ["    " if bits & E and not bits & MASKED else "   |" for bits in range(256)]
+ASCII_FLOORS = ["   +" if bits & S and not bits & MASKED else "---+" for bits in range(256)]
+ASCII_WALLS = [" " if bits & E and not bits & MASKED else "|" for bits in range(256)]
+
+PASSAGES = " ╵╷│╶└┌├╴┘┐┤─┴┬┼"
+COMPACT_CELLS = ["·" if bits == 0 else " " if bits & MASKED else PASSAGES[bits & 15]
+                 for bits in range(256)]
+
+# box-drawing corners indexed by up | down << 1 | left << 2 | right << 3
+CORNERS = " ╵╷│╴┘┐┤╶└┌├─┴┬┼"
+UNICODE_WALLS = [" ", "│"]
+UNICODE_CELLS = ["    ", "│   "]
+UNICODE_FLOORS = [CORNERS[code & 15] + ("───" if code & 16 else "   ") for code in range(32)]
+
+
+def ascii_lines(rows, columns, labels=None):
+    """
+    Lines of the +---+ format; labels, if given, yields the 3-character
+    contents of every cell of each row
+    """
+    yield "+" + "---+" * columns + "\n"
+    labels = iter(labels) if labels is not None else None
+    for row in rows:
+        if labels is None:
+            cells = "".join(map(ASCII_CELLS.__getitem__, row))
+        else:
+            walls = map(ASCII_WALLS.__getitem__, row)
+            cells = "".join([text + wall for text, wall in zip(next(labels), walls)])
+        yield "|" + cells + "\n+" + "".join(map(ASCII_FLOORS.__getitem__, row)) + "\n"
+
+
+def compact_lines(rows, columns):
+    """ One character per cell, drawing the passages that leave it """
+    for row in rows:
+        yield "".join(map(COMPACT_CELLS.__getitem__, row)) + "\n"
+
+
+def unicode_lines(rows, columns, labels=None):
+    """
+    The walls of ascii_lines drawn with box-drawing characters, corners
+    included.  Walls are worked out with NumPy one row at a time as in the
+    block model of write_svg: a wall separates two positions when at least
+    one is a cell and they are not linked.
+    """
+    import numpy as np
+    none = np.full(columns, MASKED, dtype=np.uint8)
+    labels = iter(labels) if labels is not None else None
+
+    def vertical(bits):
+        # walls left of each cell and right of the last one
+        present = np.zeros(columns + 2, dtype=bool)
+        present[1:-1] = (bits & MASKED) == 0
+        opened = np.zeros(columns + 1, dtype=bool)
+        opened[1:-1] = present[1:-2] & present[2:-1] & ((bits[:-1] & E) != 0)
+        return (present[:-1] | present[1:]) & ~opened
+
+    def floor(above, below, walls_above, walls_below):
+        up = (above & MASKED) == 0
+        down = (below & MASKED) == 0
+        walls = (up | down) & ~(up & down & ((above & S) != 0))
+        padded = np.zeros(columns + 2, dtype=bool)
+        padded[1:-1] = walls
+        code = (walls_above.astype(np.uint8) | walls_below << 1 |
+                padded[:-1] << 2 | padded[1:] << 3)
+        code[:-1] |= walls.astype(np.uint8) << 4
+        code = code.tolist()
+        last = CORNERS[code.pop()]
+        return "".join(map(UNICODE_FLOORS.__getitem__, code)) + last + "\n"
+
+    above = none
+    walls_above = np.zeros(columns + 1, dtype=bool)
+    for row in rows:
+        below = np.frombuffer(bytes(row), dtype=np.uint8)
+        walls_below = vertical(below)
+        yield floor(above, below, walls_above, walls_below)
+        walls = walls_below.tolist()
+        if labels is None:
+            cells = "".join(map(UNICODE_CELLS.__getitem__, walls[:-1]))
+        else:
+            cells = "".join([UNICODE_WALLS[wall] + text for wall, text in zip(walls, next(labels))])
+        yield cells + UNICODE_WALLS[walls[-1]] + "\n"
+        above, walls_above = below, walls_below
+    yield floor(above, none, walls_above, np.zeros(columns + 1, dtype=bool))
+
+
+def text_lines(rows, columns, style='ascii', labels=None):
+    if style == 'ascii':
+        return ascii_lines(rows, columns, labels)
+    if style == 'unicode':
+        return unicode_lines(rows, columns, labels)
+    if style == 'compact':
+        return compact_lines(rows, columns)
+    raise ValueError("unknown text style %r" % style)
+
+
+def write_ascii(rows, columns, out, style='ascii', labels=None):
+    """
+    Write the rows as text, one row of cells at a time, to a text file
+    such as sys.stdout or an io.StringIO
+    """
+    write = out.write
+    for line in text_lines(rows, columns, style, labels):
+        write(line)
+
+
+def present(row, k):
+    return row is not None and 0 <= k < len(row) and not row[k] & MASKED
+
+
+def gap_blocks(above, below, columns):
+    """ Blocks of the gap row between two rows of cells (None outside) """
+    blocks = [OUT] * (2 * columns + 1)
+    for k in range(columns + 1):
+        if (present(above, k - 1) or present(above, k) or
+            present(below, k - 1) or present(below, k)):
+            blocks[2 * k] = WALL
+        if k < columns and (present(above, k) or present(below, k)):
+            if present(above, k) and present(below, k) and above[k] & S:
+                blocks[2 * k + 1] = OPEN
+            else:
+                blocks[2 * k + 1] = WALL
+    return blocks
+
+
+def cell_blocks(row, columns):
+    """ Blocks of a row of cells and of the gaps between them """
+    blocks = [OUT] * (2 * columns + 1)
+    for k in range(columns + 1):
+        if present(row, k - 1) or present(row, k):
+            blocks[2 * k] = OPEN if present(row, k) and row[k] & W else WALL
+        if present(row, k):
+            blocks[2 * k + 1] = OPEN
+    return blocks
+
+
+def each_block_row(rows, columns):
+    above = None
+    for row in rows:
+        yield gap_blocks(above, row, columns)
+        yield cell_blocks(row, columns)
+        above = row
+    yield gap_blocks(above, None, columns)
+    yield [OUT] * (2 * columns + 1)
+
+
+def wall_segments(rows, columns, cell_size=10, wall_width=2):
+    """
+    Yield (color, x1, y1, x2, y2) for every wall line.
+
+    Collinear edges of the same color are merged into one segment: along a
+    horizontal line as the blocks are scanned, along vertical lines by
+    keeping one open run per line across block rows.
+    """
+    def offset(i):
+        return (i // 2) * cell_size + (i % 2) * wall_width
+
+    xs = [offset(j) for j in range(2 * columns + 2)]
+    # vertical line j -> (color, y where its current run started)
+    runs = [None] * (2 * columns + 2)
+    above = [OUT] * (2 * columns + 1)
+    for i, blocks in enumerate(each_block_row(rows, columns)):
+        y1 = offset(i)
+
+        start = None
+        for j, (a, b) in enumerate(zip(above, blocks)):
+            color = EDGE_COLORS.get((a, b))
+            if start is not None and color != start[0]:
+                yield start[0], start[1], y1, xs[j], y1
+                start = None
+            if color and start is None:
+                start = (color, xs[j])
+        if start is not None:
+            yield start[0], start[1], y1, xs[-1], y1
+
+        left = OUT
+        for j, state in enumerate(blocks + [OUT]):
+            color = EDGE_COLORS.get((left, state))
+            run = runs[j]
+            if run is not None and run[0] != color:
+                yield run[0], xs[j], run[1], xs[j], y1
+                runs[j] = run = None
+            if color and run is None:
+                runs[j] = (color, y1)
+            left = state
+        above = blocks
+
+
+@profiling.timed('render.write_svg')
+def write_svg(rows, n_rows, columns, out, cell_size=10, wall_width=2,
+              flush_every=4096, fills=None):
+    """
+    Write the rows as an SVG image with the wall scheme of Grid.to_svg.
+
+    Wall segments are collected into one <path> per color, which is
+    written out every flush_every segments to keep memory bounded.  fills,
+    if given, has one list of cell background colors (None for no fill)
+    per row, drawn under the walls.
+    """
+    width = cell_size * columns + wall_width
+    height = cell_size * n_rows + wall_width
+    out.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+    out.write('<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+              'width="%dmm" height="%dmm" viewBox="0 0 %d %d">\n'
+              % (width, height, width, height))
+    out.write('<g fill="none" stroke-width="1">\n')
+
+    paths = {INNER_WALL_COLOR: [], OUTER_WALL_COLOR: []}
+    profile = profiling.ACTIVE
+
+    def filled(rows):
+        # each row is filled as it is read, before any wall touching it
+        # has been produced
+        for y, (row, colors) in enumerate(zip(rows, fills)):
+            if profile is not None:
+                profile.count('svg.elements', sum(1 for color in colors if color))
+            for k, color in enumerate(colors):
+                if color:
+                    out.write('<rect fill="%s" x="%d" y="%d" width="%d" height="%d" />\n'
+                              % (color, k * cell_size + wall_width, y * cell_size + wall_width,
+                                 cell_size - wall_width, cell_size - wall_width))
+            yield row
+
+    if fills is not None:
+        rows = filled(rows)
+
+    def flush(color):
+        if paths[color]:
+            out.write('<path stroke="%s" d="%s" />\n' % (color, "".join(paths[color])))
+            paths[color] = []
+            if profile is not None:
+                profile.count('svg.elements')
+
+    for color, x1, y1, x2, y2 in wall_segments(rows, columns, cell_size, wall_width):
+        if y1 == y2:
+            paths[color].append("M%d %dH%d" % (x1, y1, x2))
+        else:
+            paths[color].append("M%d %dV%d" % (x1, y1, y2))
+        if len(paths[color]) >= flush_every:
+            flush(color)
+    for color in paths:
+        flush(color)
+    out.write('</g>\n</svg>\n')
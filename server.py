@@ -0,0 +1,265 @@
+"""
+Asyncio HTTP server generating and rendering mazes for local clients.
+
+    python server.py --port 8765
+    curl 'http://127.0.0.1:8765/maze?algorithm=growing_tree&rows=30&columns=40&seed=7&format=svg'
+
+Generation and rendering run in a process pool so the event loop keeps
+serving while big mazes are built, and the output is returned from
+memory.  Finished outputs are kept in an LRU cache bounded by their total
+size in bytes, keyed by (algorithm, rows, columns, choose, mask hash,
+seed, format); a request for an output that is still being produced waits
+for that one instead of starting another.
+
+Query parameters: algorithm (see batch.ALGORITHMS), rows, columns, seed
+(random if missing, returned in the X-Maze-Seed header), format (see
+FORMATS), choose (GrowingTree strategy) and mask (the name of an image
+in the server's mask directory, overriding rows and columns; masks are
+refused unless the server was started with --mask-dir).
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import io
+import multiprocessing
+import os
+import random
+import sys
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+import batch
+import compact_grid
+import raster
+
+# format -> content type
+FORMATS = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+    'ascii': 'text/plain; charset=utf-8',
+    'unicode': 'text/plain; charset=utf-8',
+    'compact': 'text/plain; charset=utf-8',
+    'binary': 'application/octet-stream',
+}
+
+CACHE_BYTES = 64 * 1024 * 1024
+# largest maze a request may ask for
+MAX_CELLS = 4000 * 4000
+# largest png or svg image, in pixels of CELL_SIZE cells
+MAX_PIXELS = 64 * 1024 * 1024
+CELL_SIZE = 10
+WALL_WIDTH = 2
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class Cache:
+    """ LRU mapping of keys to bytes, evicting once max_bytes are held """
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()
+
+    def get(self, key):
+        data = self.items.get(key)
+        if data is not None:
+            self.items.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        if key in self.items:
+            self.size -= len(self.items.pop(key))
+        self.items[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self.items.popitem(last=False)
+            self.size -= len(evicted)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def image_pixels(rows, columns):
+    return (rows * CELL_SIZE + WALL_WIDTH) * (columns * CELL_SIZE + WALL_WIDTH)
+
+
+def produce(job, format):
+    """ Worker: the maze of job rendered in format, as bytes """
+    result = batch.generate(job)
+    if format == 'binary':
+        return result.data
+    grid = result.to_grid(compact_grid.CompactGrid)
+    if format == 'png':
+        return raster.render(grid, CELL_SIZE, WALL_WIDTH).to_png()
+    if format == 'svg':
+        out = io.StringIO()
+        grid.write_svg(out, CELL_SIZE, WALL_WIDTH)
+        return out.getvalue().encode('utf-8')
+    return grid.to_ascii(format).encode('utf-8')
+
+
+@batch.cached_by_file(maxsize=64)
+def mask_hash(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def mask_info(filename):
+    """ Worker: (digest, rows, columns) of a mask image """
+    mask = batch.load_mask(filename)
+    return mask_hash(filename), mask.n_rows, mask.n_columns
+
+
+def mask_path(mask_dir, name):
+    """
+    The file of mask name inside mask_dir; ValueError for names that are
+    absolute, contain '..' or do not name a file there
+    """
+    if mask_dir is None:
+        raise ValueError("masks are not enabled on this server")
+    parts = name.replace('\\', '/').split('/')
+    if os.path.isabs(name) or '..' in parts:
+        raise ValueError("invalid mask name %r" % name)
+    root = os.path.realpath(mask_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    # a symbolic link inside the directory may still point out of it
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise ValueError("unknown mask %r" % name)
+    return path
+
+
+class MazeServer:
+
+    async def parse(self, query):
+        """ (cache key, Job, format) of a request's query parameters """
+        params = {name: values[-1] for name, values in parse_qs(query).items()}
+        format = params.get('format', 'svg')
+        if format not in FORMATS:
+            raise ValueError("unknown format %r" % format)
+        rows = int(params.get('rows', 20))
+        columns = int(params.get('columns', 20))
+        mask = params.get('mask')
+        digest = None
+        if mask:
+            mask = mask_path(self.mask_dir, mask)
+            # hashing and decoding an image would hold up every other client
+            loop = asyncio.get_running_loop()
+            digest, rows, columns = await loop.run_in_executor(self.executor, mask_info, mask)
+        if not (0 < rows and 0 < columns and rows * columns <= MAX_CELLS):
+            raise ValueError("maze size must be between 1 and %d cells" % MAX_CELLS)
+        if format in ('png', 'svg') and image_pixels(rows, columns) > MAX_PIXELS:
+            raise ValueError("%s images are limited to %d pixels" % (format, MAX_PIXELS))
+        seed = int(params['seed']) if 'seed' in params else random.getrandbits(32)
+        algorithm = params.get('algorithm', 'growing_tree')
+        choose = params.get('choose')
+        job = batch.Job(algorithm, rows, columns, seed, mask, choose)
+        key = (algorithm, rows, columns, choose, digest, seed, format)
+        return key, job, format
+
+    async def output(self, key, job, format):
+        """ The bytes for key, from the cache, a pending request or a worker """
+        data = self.cache.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+        pending = self.pending.get(key)
+        if pending is None:
+            self.misses += 1
+            loop = asyncio.get_running_loop()
+            pending = loop.run_in_executor(self.executor, produce, job, format)
+            self.pending[key] = pending
+            pending.add_done_callback(functools.partial(self.finished, key))
+        # a client going away must not cancel the work others wait for
+        return await asyncio.shield(pending)
+
+    def finished(self, key, future):
+        del self.pending[key]
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            status, headers, body = await self.respond(request.decode('latin-1'))
+        except ValueError as error:
+            status, headers, body = 400, {}, ("%s\n" % error).encode('utf-8')
+        except Exception as error:
+            status, headers, body = 500, {}, ("%s\n" % error).encode('utf-8')
+        headers.setdefault('Content-Type', 'text/plain; charset=utf-8')
+        lines = ["HTTP/1.1 %d %s" % (status, REASONS.get(status, ''))]
+        lines += ["%s: %s" % item for item in headers.items()]
+        lines += ["Content-Length: %d" % len(body), "Connection: close", "", ""]
+        writer.write("\r\n".join(lines).encode('latin-1') + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def respond(self, request):
+        """ (status, headers, body) for an HTTP request line """
+        parts = request.split()
+        if len(parts) != 3:
+            return 400, {}, b"malformed request\n"
+        method, target, _ = parts
+        if method != 'GET':
+            return 405, {}, b"only GET is supported\n"
+        url = urlsplit(target)
+        if url.path != '/maze':
+            return 404, {}, b"try /maze\n"
+        try:
+            key, job, format = await self.parse(url.query)
+        except (ValueError, OSError) as error:
+            return 400, {}, ("%s\n" % error).encode('utf-8')
+        data = await self.output(key, job, format)
+        return 200, {'Content-Type': FORMATS[format], 'X-Maze-Seed': str(job.seed)}, data
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __init__(self, cache_bytes=CACHE_BYTES, processes=None, mask_dir=None):
+        self.cache = Cache(cache_bytes)
+        # the only directory masks are read from, None to refuse masks
+        self.mask_dir = mask_dir
+        # forked workers would inherit the sockets of open connections and
+        # keep them from closing
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self.executor = concurrent.futures.ProcessPoolExecutor(processes, mp_context=context)
+        # key -> future of an output being produced
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve mazes over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--cache-mb', type=float, default=CACHE_BYTES / 1024 / 1024)
+    parser.add_argument('--mask-dir', help="directory of the mask images clients may use")
+    args = parser.parse_args(argv)
+
+    server = MazeServer(int(args.cache_mb * 1024 * 1024), args.processes, args.mask_dir)
+    print("serving on http://%s:%d/maze" % (args.host, args.port), file=sys.stderr)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
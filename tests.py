@@ -1,6 +1,6 @@
 #####
 import maze
-from binary_tree import Binary_tree
+from binary_tree import BinaryTree
 
 print('##################################')
 print('testing Cell class')
@@ -57,17 +57,386 @@ g.reload_cells()
 for cell in g.each_cell():
     print(cell)
 print('row iteration backward')
-for row in g.each_row(forward=False):
+for row in reversed(list(g.each_row())):
     print(row)
 print('cell iteration backward')
-for cell in g.each_cell(forward=False):
+for cell in reversed(list(g.each_cell())):
     print(cell)
 
 print('##################################')
 print('testing Binary tree')
 
 g=maze.Grid(10,10)
-Binary_tree(g)
+BinaryTree(g).build_maze(g)
 print(g)
 
 
+
+print('##################################')
+print('testing image readers')
+import os
+import struct
+import tempfile
+import zlib
+import numpy as np
+import images
+
+def png_chunk(kind, body):
+    return (struct.pack(">I", len(body)) + kind + body +
+            struct.pack(">I", zlib.crc32(kind + body) & 0xffffffff))
+
+def png_filter(kind, line, previous, unit):
+    out = bytearray()
+    for i, x in enumerate(line):
+        a = line[i - unit] if i >= unit else 0
+        b = previous[i]
+        c = previous[i - unit] if i >= unit else 0
+        if kind == 0:
+            predictor = 0
+        elif kind == 1:
+            predictor = a
+        elif kind == 2:
+            predictor = b
+        elif kind == 3:
+            predictor = (a + b) >> 1
+        else:
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            predictor = a if pa <= pb and pa <= pc else b if pb <= pc else c
+        out.append((x - predictor) & 0xff)
+    return bytes(out)
+
+def write_png(filename, samples, color_type, depth, palette=None):
+    height, width, channels = samples.shape
+    if depth == 16:
+        packed = samples.astype('>u2').reshape(height, -1).view(np.uint8)
+    elif depth == 8:
+        packed = samples.astype(np.uint8).reshape(height, -1)
+    else:
+        shifts = np.arange(depth - 1, -1, -1)
+        bits = (samples.reshape(height, -1, 1) >> shifts) & 1
+        packed = np.packbits(bits.reshape(height, -1).astype(np.uint8), axis=1)
+    unit = max(1, channels * depth // 8)
+    raw = bytearray()
+    previous = bytes(packed.shape[1])
+    for y, row in enumerate(packed):
+        line = row.tobytes()
+        # cycle through the five filter types
+        raw.append(y % 5)
+        raw += png_filter(y % 5, line, previous, unit)
+        previous = line
+    data = images.PNG_SIGNATURE
+    data += png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, depth, color_type, 0, 0, 0))
+    if palette is not None:
+        data += png_chunk(b"PLTE", palette.tobytes())
+    data += png_chunk(b"IDAT", zlib.compress(bytes(raw)))
+    data += png_chunk(b"IEND", b"")
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+rng = np.random.default_rng(7)
+folder = tempfile.mkdtemp()
+filename = os.path.join(folder, 'image.png')
+for color_type, depths in ((0, (1, 2, 4, 8, 16)), (2, (8, 16)), (3, (1, 2, 4, 8)),
+                           (4, (8, 16)), (6, (8, 16))):
+    for depth in depths:
+        channels = images.PNG_CHANNELS[color_type]
+        samples = rng.integers(0, 1 << depth, (9, 13, channels))
+        palette = None
+        if color_type == 3:
+            palette = rng.integers(0, 256, (1 << depth, 3)).astype(np.uint8)
+            expected = palette[samples[..., 0]]
+        else:
+            expected = samples >> 8 if depth == 16 else samples * (255 // ((1 << depth) - 1))
+            if color_type in (4, 6):
+                expected = expected[..., :-1]
+        write_png(filename, samples, color_type, depth, palette)
+        assert (images.read_image(filename) == expected).all(), (color_type, depth)
+        print('PNG color type %d, bit depth %d: ok' % (color_type, depth))
+
+pixels = rng.integers(0, 256, (5, 7, 3)).astype(np.uint8)
+for magic, data in ((b"P6", pixels.tobytes()), (b"P5", pixels[..., 0].tobytes()),
+                    (b"P2", " ".join(map(str, pixels[..., 0].ravel())).encode())):
+    filename = os.path.join(folder, 'image.pnm')
+    with open(filename, 'wb') as f:
+        f.write(magic + b"\n# comment\n7 5\n255\n" + data)
+    expected = pixels if magic == b"P6" else pixels[..., :1]
+    assert (images.read_image(filename) == expected).all(), magic
+    print('%s: ok' % magic.decode())
+
+print('##################################')
+print('testing IndexSet')
+import random
+members = maze.IndexSet(50, full=True)
+expected = set(range(50))
+rng = random.Random(3)
+for _ in range(500):
+    i = rng.randrange(50)
+    if rng.random() < 0.5:
+        members.add(i)
+        expected.add(i)
+    else:
+        members.discard(i)
+        expected.discard(i)
+    assert set(members) == expected and len(members) == len(expected)
+    assert all((i in members) == (i in expected) for i in range(50))
+    assert all(members.where[m] == slot for slot, m in enumerate(members.members))
+    if expected:
+        assert members.choice(rng) in expected
+members.fill(np.array([4, 8, 15, 16, 23, 42]))
+assert sorted(members) == [4, 8, 15, 16, 23, 42] and 15 in members and 14 not in members
+print('IndexSet add/discard/fill: ok')
+on = np.random.default_rng(5).random((20, 30)) > 0.4
+mask = maze.Mask.from_bools(on)
+assert mask.enabled is None and mask.count() == on.sum()
+mask[0, 0] = True
+on[0, 0] = True
+assert sorted(mask.index) == list(np.flatnonzero(on))
+mask[0, 1] = not on[0, 1]
+on[0, 1] = not on[0, 1]
+assert sorted(mask.index) == list(np.flatnonzero(on)) and mask.count() == on.sum()
+assert all(on[mask.random_location(rng)] for _ in range(100))
+print('Mask.from_bools: ok')
+
+print('##################################')
+print('testing maze files')
+import compact_grid
+import mazefile
+from growing_tree import GrowingTree
+on = np.random.default_rng(9).random((7, 13)) > 0.3
+for grid in (maze.Grid(7, 13), maze.MaskedGrid(maze.Mask.from_bools(on)),
+             compact_grid.CompactGrid(7, 13), compact_grid.CompactGrid(7, 13, maze.Mask.from_bools(on))):
+    GrowingTree(grid).build_maze(grid)
+    links = compact_grid.link_array(grid)
+    data = mazefile.dumps(grid)
+    expected = mazefile.HEADER.size + mazefile.links_size(7, 13)
+    if (links & compact_grid.MASKED).any():
+        expected += mazefile.mask_size(7, 13)
+    assert len(data) == expected
+    for cls in (maze.Grid, compact_grid.CompactGrid):
+        assert (compact_grid.link_array(mazefile.loads(data, cls)) == links).all(), (grid, cls)
+    filename = os.path.join(folder, 'maze.bin')
+    mazefile.save(grid, filename)
+    assert (compact_grid.link_array(mazefile.load(filename)) == links).all()
+    with mazefile.MazeFile(filename) as view:
+        assert all(view[row, column] == links[row, column]
+                   for row in range(7) for column in range(13))
+        assert view[-1, 0] == view[0, 13] == compact_grid.MASKED
+    print('%s %s: ok' % (type(grid).__name__, 'masked' if (links & compact_grid.MASKED).any() else 'full'))
+for broken in (b"MAZX" + data[4:], data[:4] + b"\x09\x00" + data[6:]):
+    try:
+        mazefile.loads(broken)
+    except ValueError as error:
+        print('rejected:', error)
+    else:
+        raise AssertionError("a broken header was accepted")
+for length in (0, 5, mazefile.HEADER.size, mazefile.HEADER.size + 3, len(data) - 1):
+    with open(filename, 'wb') as f:
+        f.write(data[:length])
+    for read in (lambda: mazefile.loads(data[:length]), lambda: mazefile.MazeFile(filename)):
+        try:
+            read()
+        except ValueError as error:
+            # mmap refuses empty files with its own message
+            assert length == 0 or str(error) == "truncated maze file", error
+        else:
+            raise AssertionError("a maze file cut at %d bytes was accepted" % length)
+print('truncated maze files: rejected')
+
+print('##################################')
+print('testing tree distance index')
+import braid
+import distances
+import lca
+on = np.random.default_rng(4).random((40, 60)) > 0.35
+for grid in (compact_grid.CompactGrid(40, 60), maze.MaskedGrid(maze.Mask.from_bools(on))):
+    GrowingTree(grid, choose='newest/random').build_maze(grid)
+    index = lca.TreeIndex(grid)
+    links = bytearray(compact_grid.link_array(grid).tobytes())
+    cells = index.nodes
+    for start in rng.sample(list(cells), 20):
+        expected = np.array(distances.flood_links(links, grid.columns, start))[cells]
+        found = index.distances(np.full(len(cells), start), cells)
+        assert (found == expected).all(), start
+        for goal in rng.sample(list(cells), 5):
+            if expected[index.node(goal)] < 0:
+                continue
+            path = index.path(start, goal)
+            assert index.distance(start, goal) == len(path) - 1 == expected[index.node(goal)]
+            assert all(links[a] & compact_grid.direction_bits(grid.columns, a, b)[0]
+                       for a, b in zip(path, path[1:]))
+    print('%s: distances match a breadth-first search' % type(grid).__name__)
+masked_cell = int(np.flatnonzero(~on)[0])
+for query in (index.distances, index.lcas):
+    try:
+        query(np.array([masked_cell]), np.array([int(cells[0])]))
+    except ValueError as error:
+        print('rejected:', error)
+    else:
+        raise AssertionError("a masked cell was queried")
+braid.braid(grid)
+try:
+    lca.TreeIndex(grid)
+except ValueError as error:
+    print('rejected:', error)
+else:
+    raise AssertionError("a maze with loops was indexed")
+
+print('##################################')
+print('testing generators')
+import graph
+import growing_tree
+
+
+def is_perfect(grid):
+    """ One passage fewer than cells, and every cell reachable from one """
+    links = compact_grid.link_array(grid).reshape(-1)
+    present = np.flatnonzero(compact_grid.presence(grid).reshape(-1))
+    passages = int(graph.DEGREE[links].sum()) // 2
+    reached = np.array(distances.flood_links(bytearray(links.tobytes()), grid.columns, int(present[0])))
+    return passages == len(present) - 1 and (reached[present] >= 0).all()
+
+
+for grid in (maze.Grid(15, 20), compact_grid.CompactGrid(15, 20)):
+    # grow_tree on its own, without build_maze setting anything up
+    generator = GrowingTree(grid, random.Random(2), choose='oldest/random')
+    generator.grow_tree(grid, grid[7, 9])
+    assert is_perfect(grid), type(grid).__name__
+    print('%s GrowingTree.grow_tree: perfect' % type(grid).__name__)
+
+from kruskals import Kruskals
+from wilsons import Wilsons, AldousBroderWilsons
+makers = [
+    ('Wilsons', lambda grid, rng: Wilsons(grid, rng)),
+    ('AldousBroderWilsons', lambda grid, rng: AldousBroderWilsons(grid, rng)),
+    ('Kruskals', lambda grid, rng: Kruskals(grid, rng)),
+    # tiles built by worker processes, joined along the seams
+    ('tiled Kruskals', lambda grid, rng: Kruskals(grid, rng, tile_size=8, processes=2)),
+]
+for name, make in makers:
+    for cls in (maze.Grid, compact_grid.CompactGrid):
+        grid = cls(21, 30)
+        make(grid, random.Random(6)).build_maze(grid)
+        assert is_perfect(grid), (name, cls.__name__)
+        print('%s on %s: perfect' % (name, cls.__name__))
+
+import io
+import render
+from ellers import Ellers
+rows = [bytes(row) for row in Ellers(12, 17, random.Random(11)).each_row()]
+links = np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(12, 17)
+assert is_perfect(mazefile.from_links(links, compact_grid.CompactGrid))
+grid = maze.Grid(12, 17)
+Ellers(12, 17, random.Random(11)).build_maze(grid)
+assert (compact_grid.link_array(grid) == links).all()
+out = io.StringIO()
+render.write_ascii(Ellers(12, 17, random.Random(11)).each_row(), 17, out)
+assert out.getvalue() == grid.to_ascii()
+print('Ellers: perfect, streamed rows match the built grid')
+
+import re
+
+
+def wall_units(color, x1, y1, x2, y2):
+    """ The unit-length pieces of a horizontal or vertical wall line """
+    if y1 == y2:
+        return {(color, x, y1, x + 1, y1) for x in range(min(x1, x2), max(x1, x2))}
+    return {(color, x1, y, x1, y + 1) for y in range(min(y1, y2), max(y1, y2))}
+
+
+def to_svg_walls(grid):
+    out = io.StringIO()
+    grid.to_svg(filename=out)
+    walls = set()
+    pattern = r'<line stroke="(\w+)"[^>]*x1="(\d+)mm" x2="(\d+)mm" y1="(\d+)mm" y2="(\d+)mm"'
+    for color, x1, x2, y1, y2 in re.findall(pattern, out.getvalue()):
+        walls |= wall_units(color, int(x1), int(y1), int(x2), int(y2))
+    return walls
+
+
+def write_svg_walls(grid):
+    out = io.StringIO()
+    grid.write_svg(out)
+    walls = set()
+    for color, path in re.findall(r'<path stroke="(\w+)" d="([^"]*)"', out.getvalue()):
+        for x, y, axis, end in re.findall(r'M(\d+) (\d+)([HV])(\d+)', path):
+            x, y, end = int(x), int(y), int(end)
+            walls |= wall_units(color, x, y, end, y) if axis == 'H' else wall_units(color, x, y, x, end)
+    return walls
+
+
+grid = maze.Grid(9, 13)
+GrowingTree(grid, random.Random(1)).build_maze(grid)
+assert write_svg_walls(grid) == to_svg_walls(grid)
+on = np.random.default_rng(0).random((9, 13)) > 0.3
+grid = maze.MaskedGrid(maze.Mask.from_bools(on))
+GrowingTree(grid, random.Random(1)).build_maze(grid)
+# to_svg outlines some wall corners next to masked cells, see write_svg
+assert write_svg_walls(grid) <= to_svg_walls(grid)
+print('write_svg draws the walls of to_svg')
+
+import eventlog
+for cls in (maze.Grid, compact_grid.CompactGrid):
+    grid = cls(14, 19)
+    log = eventlog.EventLog(grid)
+    GrowingTree(grid, random.Random(8), choose='newest/random', log=log).build_maze(grid)
+    assert (log.link_bits() == compact_grid.link_array(grid)).all()
+    assert (compact_grid.link_array(log.replay(cls=cls)) == compact_grid.link_array(grid)).all()
+    # the first event seeds the only tree, every other one is a passage
+    half = compact_grid.link_array(log.replay(len(log) // 2)).reshape(-1)
+    assert int(graph.DEGREE[half].sum()) // 2 == len(log) // 2 - 1
+    print('%s: replaying the GrowingTree log rebuilds the maze' % cls.__name__)
+
+on = np.random.default_rng(2).random((10, 12)) > 0.3
+for grid in (maze.Grid(10, 12), maze.MaskedGrid(maze.Mask.from_bools(on)),
+             compact_grid.CompactGrid(10, 12), compact_grid.CompactGrid(10, 12, maze.Mask.from_bools(on))):
+    present = compact_grid.presence(grid)
+    GrowingTree(grid, random.Random(4)).build_maze(grid)
+    grid.reset()
+    links = compact_grid.link_array(grid)
+    assert (links == np.where(present, 0, compact_grid.MASKED)).all()
+    assert not any(cell.get_visited() for cell in grid.each_cell())
+    # the same grid takes a new maze, with the same positions masked
+    GrowingTree(grid, random.Random(5)).build_maze(grid)
+    assert (compact_grid.presence(grid) == present).all()
+    if present.all():
+        assert is_perfect(grid)
+    print('%s%s.reset: ok' % ('masked ' if not present.all() else '', type(grid).__name__))
+pool = maze.GridPool(compact_grid.CompactGrid)
+with pool.grid(6, 7) as grid:
+    GrowingTree(grid).build_maze(grid)
+with pool.grid(6, 7) as again:
+    assert again is grid and not compact_grid.link_array(again).any()
+with pool.grid(7, 6) as other:
+    assert other is not grid
+print('GridPool reuses grids of the same size')
+
+for cls in (maze.Grid, compact_grid.CompactGrid):
+    grid = cls(15, 20)
+    GrowingTree(grid, random.Random(3), choose='newest/random').build_maze(grid)
+    index = lca.TreeIndex(grid)
+    found = distances.Distances(grid, grid[0, 0])
+    assert all(found[cell] == index.distance(0, cell.row * 20 + cell.column) for cell in grid.each_cell())
+    path = distances.longest_path(grid)
+    end, length = path.max()
+    assert sum(1 for d in path.cells if d >= 0) == length + 1
+    assert distances.Distances(grid, path.root)[end] == length
+    # no pair of cells is farther apart
+    assert length == max(distances.Distances(grid, cell).max()[1] for cell in grid.each_cell())
+
+    before = len(braid.dead_ends(grid))
+    added = braid.braid(grid, 0.5, random.Random(3))
+    assert 0 < len(braid.dead_ends(grid)) < before
+    links = compact_grid.link_array(grid).reshape(-1)
+    assert int(graph.DEGREE[links].sum()) // 2 == 15 * 20 - 1 + len(added)
+    braid.braid(grid, 1.0, random.Random(3))
+    assert len(braid.dead_ends(grid)) == 0
+    print('%s: longest path and braiding ok' % cls.__name__)
+
+    grid = cls(15, 20)
+    GrowingTree(grid, random.Random(3)).build_maze(grid)
+    removed = braid.sparsify(grid, 0.25, random.Random(3))
+    links = compact_grid.link_array(grid).reshape(-1)
+    assert len(removed) == 15 * 20 // 4 and not links[removed].any()
+    assert int(graph.DEGREE[links].sum()) // 2 == 15 * 20 - len(removed) - 1
+    print('%s: sparsify removed a quarter of the cells' % cls.__name__)
@@ -0,0 +1,430 @@
+"""
+Grid shapes as flat neighbor tables.
+
+A Topology numbers its cells 0 .. size - 1 and lists the neighbors of
+cell i in table[i * width:(i + 1) * width], one slot per side of the
+cell and -1 where there is no neighbor.  Passages are kept as one bit per
+slot in links, and back[i * width + k] is the slot of the neighbor that
+leads back to i, so linking is two array writes whatever the shape.
+
+SquareTopology uses the slots N, S, E, W in that order, which makes its
+links byte-for-byte the link bits of a CompactGrid.  HexTopology,
+TriangleTopology and PolarTopology follow the shapes of the book.
+TableGrowingTree and TableBinaryTree build mazes on any of them.
+"""
+import math
+import random
+from array import array
+import numpy as np
+import compact_grid
+import growing_tree
+import maze
+
+
+class Topology:
+
+    # slot names, set by each shape
+    SLOTS = ()
+
+    def __init__(self, table, width, present=None):
+        # table: (size, width) int array of neighbor indices, -1 for none
+        table = np.asarray(table, dtype=np.int32).reshape(-1, width)
+        self.size = len(table)
+        self.width = width
+        self.present = (np.ones(self.size, dtype=bool) if present is None
+                        else np.asarray(present, dtype=bool).reshape(-1))
+        self.table = array('i', table.tobytes())
+        self.back = array('i', back_slots(table).tobytes())
+        self.links = array('B' if width <= 8 else 'H', bytes(self.size * (1 if width <= 8 else 2)))
+
+    def neighbors(self, i):
+        """ Indices of the neighbors of cell i """
+        return [j for j in self.table[i * self.width:(i + 1) * self.width] if j >= 0]
+
+    def link(self, i, k):
+        """ Open the passage from cell i through its slot k """
+        j = self.table[i * self.width + k]
+        self.links[i] |= 1 << k
+        self.links[j] |= 1 << self.back[i * self.width + k]
+
+    def unlink(self, i, k):
+        j = self.table[i * self.width + k]
+        self.links[i] &= ~(1 << k)
+        self.links[j] &= ~(1 << self.back[i * self.width + k])
+
+    def is_linked(self, i, k):
+        return bool(self.links[i] >> k & 1)
+
+    def get_links(self, i):
+        """ Indices of the cells linked to cell i """
+        bits = self.links[i]
+        base = i * self.width
+        return [self.table[base + k] for k in range(self.width) if bits >> k & 1]
+
+    def reset(self):
+        self.links[:] = array(self.links.typecode, bytes(len(self.links) * self.links.itemsize))
+
+    def side(self, i, k):
+        """
+        The wall of cell i on its slot k as (x1, y1, x2, y2) in units of
+        one cell, or None if the cell has no such side
+        """
+        raise NotImplementedError
+
+    def extent(self):
+        """ (width, height) of the drawing in units of one cell """
+        raise NotImplementedError
+
+    def walls(self):
+        """
+        Yield every wall once: sides without a neighbor, and sides between
+        unlinked cells drawn from the lower-numbered one
+        """
+        table, width, links, present = self.table, self.width, self.links, self.present
+        for i in range(self.size):
+            if not present[i]:
+                continue
+            bits = links[i]
+            for k in range(width):
+                j = table[i * width + k]
+                if j < 0 or not present[j] or (j > i and not bits >> k & 1):
+                    segment = self.side(i, k)
+                    if segment is not None:
+                        yield segment
+
+    def write_svg(self, out, cell_size=10, wall_width=2):
+        """ Write the maze as an SVG image to a text file """
+        width, height = self.extent()
+        margin = wall_width
+        out.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+        out.write('<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+                  'viewBox="0 0 %g %g">\n' % (width * cell_size + 2 * margin,
+                                              height * cell_size + 2 * margin))
+        out.write('<path fill="none" stroke="black" stroke-width="1" d="')
+        for x1, y1, x2, y2 in self.walls():
+            out.write("M%.2f %.2fL%.2f %.2f" % (x1 * cell_size + margin, y1 * cell_size + margin,
+                                               x2 * cell_size + margin, y2 * cell_size + margin))
+        out.write('" />\n</svg>\n')
+
+
+def back_slots(table):
+    """ For every (cell, slot), the slot of the neighbor pointing back """
+    size, width = table.shape
+    cells = np.repeat(np.arange(size, dtype=np.int32), width).reshape(size, width)
+    neighbor_rows = table[np.maximum(table, 0)]
+    back = np.argmax(neighbor_rows == cells[:, :, None], axis=2).astype(np.int32)
+    back[table < 0] = -1
+    return back
+
+
+def grid_indices(rows, columns):
+    index = np.full((rows + 2, columns + 2), -1, dtype=np.int32)
+    index[1:-1, 1:-1] = np.arange(rows * columns, dtype=np.int32).reshape(rows, columns)
+    return index
+
+
+def shifted(index, drow, dcol):
+    """ Index of the (row + drow, column + dcol) neighbor of every cell """
+    rows, columns = index.shape[0] - 2, index.shape[1] - 2
+    return index[1 + drow:1 + drow + rows, 1 + dcol:1 + dcol + columns]
+
+
+class SquareTopology(Topology):
+
+    SLOTS = ('north', 'south', 'east', 'west')
+
+    def __init__(self, rows, columns, mask=None):
+        self.rows = rows
+        self.columns = columns
+        index = grid_indices(rows, columns)
+        present = None
+        if mask is not None:
+            present = np.frombuffer(mask.bits, dtype=np.uint8).reshape(rows, columns).astype(bool)
+            index[1:-1, 1:-1][~present] = -1
+        table = np.stack([shifted(index, -1, 0), shifted(index, 1, 0),
+                          shifted(index, 0, 1), shifted(index, 0, -1)], axis=2)
+        if present is not None:
+            table[~present] = -1
+        super(SquareTopology, self).__init__(table, 4, present)
+
+    def side(self, i, k):
+        row, column = divmod(i, self.columns)
+        if k == 0:
+            return (column, row, column + 1, row)
+        if k == 1:
+            return (column, row + 1, column + 1, row + 1)
+        if k == 2:
+            return (column + 1, row, column + 1, row + 1)
+        return (column, row, column, row + 1)
+
+    def extent(self):
+        return self.columns, self.rows
+
+    def to_grid(self):
+        """ The maze as a CompactGrid, whose link bits are the same """
+        present = self.present.reshape(self.rows, self.columns)
+        mask = None if present.all() else maze.Mask.from_bools(present)
+        grid = compact_grid.CompactGrid(self.rows, self.columns, mask)
+        compact_grid.link_array(grid)[...] |= np.frombuffer(self.links, dtype=np.uint8).reshape(present.shape)
+        return grid
+
+
+class HexTopology(Topology):
+    """
+    Flat-topped hexagons in columns, odd columns shifted half a cell down
+    """
+
+    SLOTS = ('northwest', 'north', 'northeast', 'southwest', 'south', 'southeast')
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        index = grid_indices(rows, columns)
+        odd = (np.arange(columns) % 2 == 1)[None, :]
+        # the diagonal neighbors of even columns are one row further up
+        north_diagonal = lambda dcol: np.where(odd, shifted(index, 0, dcol), shifted(index, -1, dcol))
+        south_diagonal = lambda dcol: np.where(odd, shifted(index, 1, dcol), shifted(index, 0, dcol))
+        table = np.stack([north_diagonal(-1), shifted(index, -1, 0), north_diagonal(1),
+                          south_diagonal(-1), shifted(index, 1, 0), south_diagonal(1)], axis=2)
+        super(HexTopology, self).__init__(table, 6)
+
+    def corners(self, i):
+        row, column = divmod(i, self.columns)
+        a, b = 0.5, math.sqrt(3) / 2
+        cx = 1 + 3 * column * a
+        cy = b + 2 * row * b + (b if column % 2 else 0)
+        return (cx - 1, cx - a, cx + a, cx + 1), (cy - b, cy, cy + b)
+
+    def side(self, i, k):
+        (far_west, near_west, near_east, far_east), (north, middle, south) = self.corners(i)
+        return [(far_west, middle, near_west, north),
+                (near_west, north, near_east, north),
+                (near_east, north, far_east, middle),
+                (far_west, middle, near_west, south),
+                (near_west, south, near_east, south),
+                (near_east, south, far_east, middle)][k]
+
+    def extent(self):
+        return 1.5 * self.columns + 0.5, math.sqrt(3) * (self.rows + 0.5)
+
+
+class TriangleTopology(Topology):
+    """
+    Alternating triangles, pointing up where row + column is even
+    """
+
+    SLOTS = ('west', 'east', 'vertical')
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        index = grid_indices(rows, columns)
+        row, column = np.indices((rows, columns))
+        upright = (row + column) % 2 == 0
+        # an upright triangle meets the row below on its base, the others
+        # the row above
+        vertical = np.where(upright, shifted(index, 1, 0), shifted(index, -1, 0))
+        table = np.stack([shifted(index, 0, -1), shifted(index, 0, 1), vertical], axis=2)
+        super(TriangleTopology, self).__init__(table, 3)
+
+    def side(self, i, k):
+        row, column = divmod(i, self.columns)
+        height = math.sqrt(3) / 2
+        west, middle, east = column * 0.5, column * 0.5 + 0.5, column * 0.5 + 1
+        if (row + column) % 2 == 0:
+            apex, base = row * height, (row + 1) * height
+        else:
+            apex, base = (row + 1) * height, row * height
+        return [(west, base, middle, apex), (east, base, middle, apex),
+                (west, base, east, base)][k]
+
+    def extent(self):
+        return (self.columns + 1) * 0.5, self.rows * math.sqrt(3) / 2
+
+
+class PolarTopology(Topology):
+    """
+    Concentric rings around a single centre cell.  Ring r is split into
+    about 2 pi r cells, a multiple of the ring inside it, so every cell
+    has one inward neighbor and one or more outward ones.
+    """
+
+    SLOTS = ('inward', 'clockwise', 'counterclockwise')
+
+    def __init__(self, rings):
+        self.rings = rings
+        counts = [1]
+        for ring in range(1, rings):
+            ratio = round(2 * math.pi * ring / counts[-1])
+            counts.append(counts[-1] * max(1, ratio))
+        self.counts = counts
+        self.starts = [0]
+        for count in counts:
+            self.starts.append(self.starts[-1] + count)
+        self.ratios = [counts[r + 1] // counts[r] for r in range(rings - 1)] + [0]
+        outward = max(self.ratios)
+        self.SLOTS = PolarTopology.SLOTS + tuple('outward%d' % m for m in range(outward))
+
+        width = 3 + outward
+        table = np.full((self.starts[-1], width), -1, dtype=np.int32)
+        for ring in range(rings):
+            start, count = self.starts[ring], counts[ring]
+            cells = np.arange(count)
+            if ring > 0:
+                table[start + cells, 0] = self.starts[ring - 1] + cells // (count // counts[ring - 1])
+                table[start + cells, 1] = start + (cells + 1) % count
+                table[start + cells, 2] = start + (cells - 1) % count
+            ratio = self.ratios[ring]
+            for m in range(ratio):
+                table[start + cells, 3 + m] = self.starts[ring + 1] + cells * ratio + m
+        super(PolarTopology, self).__init__(table, width)
+
+    def locate(self, i):
+        """ (ring, position in the ring) of cell i """
+        ring = np.searchsorted(self.starts, i, side='right') - 1
+        return int(ring), i - self.starts[ring]
+
+    def point(self, radius, turn):
+        angle = 2 * math.pi * turn
+        return self.rings + radius * math.cos(angle), self.rings + radius * math.sin(angle)
+
+    def side(self, i, k):
+        ring, c = self.locate(i)
+        count = self.counts[ring]
+        if ring == 0 and k < 3:
+            return None
+        if k == 0:
+            return self.point(ring, c / count) + self.point(ring, (c + 1) / count)
+        if k == 1:
+            return self.point(ring, (c + 1) / count) + self.point(ring + 1, (c + 1) / count)
+        if k == 2:
+            return self.point(ring, c / count) + self.point(ring + 1, c / count)
+        # outward sides: the arc facing one cell of the next ring, or the
+        # whole outer edge on the last ring
+        m, ratio = k - 3, self.ratios[ring]
+        if ratio == 0:
+            return self.point(ring + 1, c / count) + self.point(ring + 1, (c + 1) / count) if m == 0 else None
+        if m >= ratio:
+            return None
+        child, children = c * ratio + m, self.counts[ring + 1]
+        return self.point(ring + 1, child / children) + self.point(ring + 1, (child + 1) / children)
+
+    def extent(self):
+        return 2 * self.rings, 2 * self.rings
+
+
+def levels(topology):
+    """
+    Breadth-first distance of every present cell from the lowest-numbered
+    cell of its connected region, as a NumPy array (-1 for absent cells)
+    """
+    size, width = topology.size, topology.width
+    table = np.frombuffer(topology.table, dtype=np.int32).reshape(size, width)
+    depth = np.full(size, -1, dtype=np.int64)
+    depth[~topology.present] = -2
+    unreached = 0
+    while True:
+        while unreached < size and depth[unreached] != -1:
+            unreached += 1
+        if unreached == size:
+            break
+        frontier = np.array([unreached])
+        depth[unreached] = 0
+        level = 0
+        while len(frontier):
+            level += 1
+            neighbors = table[frontier].reshape(-1)
+            neighbors = np.unique(neighbors[neighbors >= 0])
+            frontier = neighbors[depth[neighbors] == -1]
+            depth[frontier] = level
+    depth[depth == -2] = -1
+    return depth
+
+
+class TableBinaryTree:
+    """
+    Binary tree generalised to any topology: every cell links to one of
+    its neighbors one step closer to a root corner, picked at random.  On
+    a square grid rooted at the top left those are its north and west
+    neighbors, which is the classic algorithm.  Vectorized with NumPy.
+    """
+
+    def build_maze(self, topology):
+        size, width = topology.size, topology.width
+        table = np.frombuffer(topology.table, dtype=np.int32).reshape(size, width)
+        depth = levels(topology)
+        closer = (table >= 0) & (depth[np.maximum(table, 0)] == depth[:, None] - 1)
+        closer &= (depth >= 0)[:, None]
+        keys = self.generator.random((size, width))
+        keys[~closer] = -1
+        slot = np.argmax(keys, axis=1)
+        cells = np.flatnonzero(closer.any(axis=1))
+        slot = slot[cells]
+
+        links = np.frombuffer(topology.links, dtype=topology.links.typecode)
+        back = np.frombuffer(topology.back, dtype=np.int32).reshape(size, width)
+        neighbors = table[cells, slot]
+        one = links.dtype.type(1)
+        np.bitwise_or.at(links, cells, one << slot.astype(links.dtype))
+        np.bitwise_or.at(links, neighbors, one << back[cells, slot].astype(links.dtype))
+
+    def __init__(self, topology, seed=None):
+        self.generator = np.random.default_rng(seed)
+
+
+class TableGrowingTree(growing_tree.GrowingTree):
+    """
+    GrowingTree over a neighbor table, with cells as plain ints.  The
+    active-list loop, the strategies (mixes included) and the profiling
+    counters are those of growing_tree.GrowingTree; event logs describe
+    square grids only and are not supported.
+    """
+
+    def build_maze(self, topology):
+        self.visited = bytearray((~topology.present).astype(np.uint8).tobytes())
+        present = np.flatnonzero(topology.present)
+        if not len(present):
+            return
+        self.grow_tree(topology, int(present[self.rng.randrange(len(present))]))
+        for cell in range(topology.size):
+            if not self.visited[cell]:
+                self.grow_tree(topology, cell)
+
+    def grow_tree(self, topology, cell):
+        self.visited[cell] = 1
+        self.grow(cell, self.expander(topology))
+
+    def expander(self, topology):
+        table, width, link = topology.table, topology.width, topology.link
+        visited = self.visited
+        choice = self.rng.choice
+
+        def expand(cell):
+            base = cell * width
+            slots = [k for k in range(width)
+                     if table[base + k] >= 0 and not visited[table[base + k]]]
+            if not slots:
+                return None
+            k = choice(slots)
+            link(cell, k)
+            neighbor = table[base + k]
+            visited[neighbor] = 1
+            return neighbor
+        return expand
+
+    def __init__(self, topology, rng=random, choose=None):
+        # unlike GrowingTree there are no Cell objects to reload
+        self.rng = rng
+        self.choose = choose
+        self.log = None
+
+
+def main():
+    for name, topology in (('square', SquareTopology(12, 16)), ('hex', HexTopology(12, 16)),
+                           ('triangle', TriangleTopology(12, 24)), ('polar', PolarTopology(10))):
+        TableGrowingTree(topology).build_maze(topology)
+        with open('./exports/%s.svg' % name, 'w') as out:
+            topology.write_svg(out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+NumPy versions of the generators whose per-cell choices are independent.
+
+Instead of visiting cells one by one they draw every random decision in a
+single batch and write the passages straight into the N/S/E/W link bytes
+of a CompactGrid without a mask.  Use CompactGrid.to_grid() when a
+regular maze.Grid is needed afterwards.
+"""
+import numpy as np
+import compact_grid
+from compact_grid import N, S, E, W
+
+
+def random_bits(rng, shape):
+    """ Array of independent fair booleans, one random bit per entry """
+    size = int(np.prod(shape))
+    raw = np.frombuffer(rng.bytes((size + 7) // 8), dtype=np.uint8)
+    return np.unpackbits(raw)[:size].reshape(shape).astype(bool)
+
+
+def link_east(links, east):
+    """ Add east/west passages for every True entry of east """
+    east = east.view(np.uint8)
+    links |= east * np.uint8(E)
+    links[..., 1:] |= east[..., :-1] * np.uint8(W)
+
+
+def link_north(links, north):
+    """ Add north/south passages for every True entry of north """
+    north = north.view(np.uint8)
+    links |= north * np.uint8(N)
+    links[..., :-1, :] |= north[..., 1:, :] * np.uint8(S)
+
+
+def grid_view(grid):
+    """
+    Writable link bytes of a CompactGrid without a mask: the passages are
+    drawn for a full rectangle, which would link masked positions
+    """
+    if getattr(grid, 'mask', None) is not None:
+        raise ValueError("vectorized generators do not support masked grids")
+    return compact_grid.link_array(grid)
+
+
+class VectorizedBinaryTree:
+    """
+    BinaryTree with all north/east decisions drawn at once.
+
+    The boundary rules are the ones of binary_tree.BinaryTree: the top row
+    always goes east, the east column always goes north and the north-east
+    corner has nowhere to go.
+    """
+
+    def links(self, shape):
+        """ Link bytes for a maze, or a stack of mazes, of the given shape """
+        north = random_bits(self.rng, shape)
+        north[..., 0, :] = False
+        north[..., :, -1] = True
+        north[..., 0, -1] = False
+        east = ~north
+        east[..., 0, -1] = False
+
+        links = np.zeros(shape, dtype=np.uint8)
+        link_north(links, north)
+        link_east(links, east)
+        return links
+
+    def build_maze(self, grid):
+        grid_view(grid)[...] |= self.links((grid.rows, grid.columns))
+
+    def batch(self, count, rows, columns):
+        """ Links of count independent rows x columns mazes in one array """
+        return self.links((count, rows, columns))
+
+    def __init__(self, grid=None, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+
+class VectorizedSidewinder:
+    """
+    Sidewinder with all run decisions drawn at once.
+
+    Each cell closes its run with probability 1/2 (always in the east
+    column, never in the top row).  Open cells link east, and every closed
+    run outside the top row links north from one member picked uniformly.
+    """
+
+    def links(self, shape):
+        rows, columns = shape[-2], shape[-1]
+        close = random_bits(self.rng, shape)
+        close[..., 0, :] = False
+        close[..., :, -1] = True
+
+        links = np.zeros(shape, dtype=np.uint8)
+        link_east(links, ~close)
+
+        # runs never cross a row boundary because the east column closes
+        # them, so the flattened array can be split into runs directly
+        ends = np.flatnonzero(close)
+        starts = np.empty_like(ends)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        chosen = starts + (self.rng.random(len(ends)) * (ends - starts + 1)).astype(ends.dtype)
+        chosen = chosen[chosen % (rows * columns) >= columns]
+
+        flat = links.reshape(-1)
+        flat[chosen] |= N
+        flat[chosen - columns] |= S
+        return links
+
+    def build_maze(self, grid):
+        grid_view(grid)[...] |= self.links((grid.rows, grid.columns))
+
+    def batch(self, count, rows, columns):
+        """ Links of count independent rows x columns mazes in one array """
+        return self.links((count, rows, columns))
+
+    def __init__(self, grid=None, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+
+def main():
+    grid = compact_grid.CompactGrid(10, 10)
+    VectorizedSidewinder(grid).build_maze(grid)
+    print(grid)
+    print(grid.to_grid())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import random
+from array import array
+import compact_grid
+import maze
+from compact_grid import link_indices
+
+class Wilsons:
+    """
+    Wilson's algorithm: loop-erased random walks from unvisited cells until
+    they hit the maze, which makes every perfect maze equally likely.
+
+    Cells are handled by flat index over the grid's neighbor table.  A walk
+    only records, for each cell, where it last left it (a next-pointer
+    array); following those pointers from the start skips every loop, so
+    no path list is ever sliced.  The unvisited cells are an IndexSet, for
+    O(1) random picks and removals.
+    """
+
+    def prepare(self, grid):
+        self.table, self.degree = compact_grid.neighbor_table(grid)
+        present = compact_grid.presence(grid).reshape(-1)
+        size = present.size
+        self.unvisited = maze.IndexSet(size)
+        self.unvisited.fill(present.nonzero()[0])
+        self.in_tree = bytearray(size)
+        self.next = array('i', [-1]) * size
+        self.roots = []
+        if not len(self.unvisited):
+            return
+        if present.all():
+            self.add_root(self.unvisited.choice(self.rng), size)
+        else:
+            self.seed_regions()
+
+    def add_root(self, cell, size):
+        self.roots.append((cell, size))
+        self.in_tree[cell] = 1
+        if self.log is not None:
+            self.log.restart(cell)
+        self.unvisited.discard(cell)
+
+    def seed_regions(self):
+        """
+        Put one root in the tree for every connected region of a masked
+        grid; a walk in a region without any maze cell would never end
+        """
+        table, degree = self.table, self.degree
+        seen = bytearray(len(self.in_tree))
+        for start in list(self.unvisited):
+            if seen[start]:
+                continue
+            seen[start] = 1
+            region = [start]
+            for cell in region:
+                for slot in range(4 * cell, 4 * cell + degree[cell]):
+                    neighbor = table[slot]
+                    if not seen[neighbor]:
+                        seen[neighbor] = 1
+                        region.append(neighbor)
+            self.add_root(region[self.rng.randrange(len(region))], len(region))
+
+    def loop_erased_walks(self, grid):
+        table, degree, in_tree, next = self.table, self.degree, self.in_tree, self.next
+        unvisited = self.unvisited
+        # int(random() * n) is several times cheaper than randrange(n)
+        random = self.rng.random
+        log = self.log
+        if log is not None:
+            steps, shift, record = log.steps, log.shift, log.events.append
+        while unvisited:
+            start = unvisited.choice(self.rng)
+            cell = start
+            while not in_tree[cell]:
+                next[cell] = cell = table[4 * cell + int(random() * degree[cell])]
+            cell = start
+            while not in_tree[cell]:
+                link_indices(grid, cell, next[cell])
+                if log is not None:
+                    record(cell << shift | steps[next[cell] - cell])
+                in_tree[cell] = 1
+                unvisited.discard(cell)
+                cell = next[cell]
+
+    def build_maze(self, grid):
+        self.prepare(grid)
+        self.loop_erased_walks(grid)
+
+    def __init__(self, grid, rng=random, log=None):
+        # log is an eventlog.EventLog recording every link
+        self.rng = rng
+        self.log = log
+        grid.reload_cells()
+
+
+class AldousBroderWilsons(Wilsons):
+    """
+    Aldous-Broder until a fraction of the cells are in the maze, then
+    Wilson's for the rest.
+
+    Aldous-Broder's random walk finds new cells quickly while most are
+    unvisited and Wilson's walks are short once the maze is large, so the
+    hybrid avoids the slow phase of each; the result is still uniform.
+    """
+
+    def build_maze(self, grid):
+        self.prepare(grid)
+        if self.roots:
+            self.random_walk(grid)
+        self.loop_erased_walks(grid)
+
+    def random_walk(self, grid):
+        table, degree, in_tree = self.table, self.degree, self.in_tree
+        unvisited = self.unvisited
+        random = self.rng.random
+        log = self.log
+        cell, size = self.roots[0]
+        remaining = int(size * self.fraction) - 1
+        while remaining > 0:
+            neighbor = table[4 * cell + int(random() * degree[cell])]
+            if not in_tree[neighbor]:
+                link_indices(grid, cell, neighbor)
+                if log is not None:
+                    log.link(cell, neighbor)
+                in_tree[neighbor] = 1
+                unvisited.discard(neighbor)
+                remaining -= 1
+            cell = neighbor
+
+    def __init__(self, grid, rng=random, fraction=1/3, log=None):
+        super(AldousBroderWilsons, self).__init__(grid, rng, log)
+        self.fraction = fraction
+
+
+def main():
+    grid = compact_grid.CompactGrid(10, 10)
+    wilsons = AldousBroderWilsons(grid)
+    wilsons.build_maze(grid)
+    print(grid)
+
+if __name__ == "__main__":
+    main()
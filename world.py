@@ -0,0 +1,141 @@
+"""
+An unbounded maze made of tiles generated on demand.
+
+Tile (tx, ty) covers rows ty * tile_rows ... and columns tx * tile_columns
+... of the world.  Its maze is grown from a seed hashed from (world seed,
+tx, ty), so a tile is the same whenever and wherever it is generated.
+Each seam between two tiles has one opening whose position is hashed
+from the seam's own coordinates; both tiles compute it on their own, so
+neighbouring tiles agree without ever looking at each other.  Recently
+used tiles are kept in an LRU cache.
+"""
+import hashlib
+import random
+import struct
+from collections import OrderedDict
+import growing_tree
+import maze
+
+# seam kinds: between (tx, ty) and (tx + 1, ty), and (tx, ty) and (tx, ty + 1)
+EAST_SEAM = 1
+SOUTH_SEAM = 2
+TILE = 0
+
+KEY = struct.Struct('<qqqB')
+
+
+def mix(seed, tx, ty, kind):
+    """ 64-bit hash of tile or seam coordinates, stable across runs """
+    digest = hashlib.blake2b(KEY.pack(seed, tx, ty, kind), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class Tile:
+    """
+    The maze of one tile and its openings: openings['east'] is the row
+    of the opening in its east wall, openings['north'] the column of the
+    one in its north wall, and so on
+    """
+
+    def __init__(self, tx, ty, grid, openings):
+        self.tx = tx
+        self.ty = ty
+        self.grid = grid
+        self.openings = openings
+
+    def __repr__(self):
+        return "Tile(%d, %d)" % (self.tx, self.ty)
+
+
+class World:
+
+    def tile_seed(self, tx, ty):
+        return mix(self.seed, tx, ty, TILE)
+
+    def openings(self, tx, ty):
+        rows, columns = self.tile_rows, self.tile_columns
+        return {
+            'north': mix(self.seed, tx, ty - 1, SOUTH_SEAM) % columns,
+            'south': mix(self.seed, tx, ty, SOUTH_SEAM) % columns,
+            'east': mix(self.seed, tx, ty, EAST_SEAM) % rows,
+            'west': mix(self.seed, tx - 1, ty, EAST_SEAM) % rows,
+        }
+
+    def generate(self, tx, ty):
+        """ Build tile (tx, ty) from scratch, in O(tile size) """
+        grid = maze.Grid(self.tile_rows, self.tile_columns)
+        rng = random.Random(self.tile_seed(tx, ty))
+        growing_tree.GrowingTree(grid, rng, self.choose).build_maze(grid)
+        return Tile(tx, ty, grid, self.openings(tx, ty))
+
+    def tile(self, tx, ty):
+        """ Tile (tx, ty), from the cache if it was used recently """
+        key = (tx, ty)
+        tile = self.cache.get(key)
+        if tile is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return tile
+        self.misses += 1
+        tile = self.generate(tx, ty)
+        self.cache[key] = tile
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return tile
+
+    def tile_of(self, row, column):
+        """ (tile, row, column within the tile) of a world cell """
+        ty, r = divmod(row, self.tile_rows)
+        tx, c = divmod(column, self.tile_columns)
+        return self.tile(tx, ty), r, c
+
+    def is_linked(self, row, column, direction):
+        """
+        True if there is a passage from world cell (row, column) to its
+        neighbour in direction 'north', 'south', 'east' or 'west'
+        """
+        tile, r, c = self.tile_of(row, column)
+        cell = tile.grid[r, c]
+        neighbor = cell.neighbor(direction)
+        if neighbor is not None:
+            return cell.is_linked(neighbor)
+        # on the tile's edge: only the seam opening leads out
+        opening = tile.openings[direction]
+        return opening == (c if direction in ('north', 'south') else r)
+
+    def region(self, top, left, rows, columns):
+        """
+        A Grid copy of the world cells top .. top + rows - 1 by left ..
+        left + columns - 1, e.g. to print or render around a player
+        """
+        grid = maze.Grid(rows, columns)
+        for r in range(rows):
+            for c in range(columns):
+                cell = grid[r, c]
+                if c + 1 < columns and self.is_linked(top + r, left + c, 'east'):
+                    cell.link(grid[r, c + 1])
+                if r + 1 < rows and self.is_linked(top + r, left + c, 'south'):
+                    cell.link(grid[r + 1, c])
+        return grid
+
+    def __init__(self, seed, tile_rows=32, tile_columns=32, cache_size=64, choose=None):
+        # cache_size is the number of tiles kept once they are no longer
+        # used, least recently used first out; choose is passed to
+        # GrowingTree
+        self.seed = seed
+        self.tile_rows = tile_rows
+        self.tile_columns = tile_columns
+        self.cache_size = cache_size
+        self.choose = choose
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+def main():
+    world = World(seed=2024, tile_rows=6, tile_columns=8)
+    # a window across the origin, spanning tiles with negative coordinates
+    print(world.region(-6, -8, 12, 16))
+
+if __name__ == "__main__":
+    main()